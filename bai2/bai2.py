@@ -1,22 +1,214 @@
-from bai2.helpers import IteratorHelper
-from bai2.parsers import Bai2FileParser
+import bz2
+import functools
+import gzip
+import io
+import lzma
+import mmap
+import os
+import pathlib
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bai2.exceptions import ParsingException
+from bai2.helpers import IteratorHelper, aread_lines, buffer_record_generator, read_lines
+from bai2.models import ParseResult
+from bai2.parsers import AsyncParser, ParallelParser, PipelinedParser, StateMachineParser
 from bai2.writers import Bai2FileWriter
 
+COMPRESSION_SUFFIXES = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'lzma',
+    '.lzma': 'lzma',
+}
+
+OPENERS = {
+    'gzip': gzip.open,
+    'bz2': bz2.open,
+    'lzma': lzma.open,
+}
+
+
+def _get_compression(name):
+    return COMPRESSION_SUFFIXES.get(pathlib.PurePath(name).suffix.lower())
+
+
+def _open_text(f, encoding=None, compression=None):
+    """
+    Opens a path or a binary file object as text, decompressed as it's read if compression is given.
+    """
+    if compression is not None:
+        if compression not in OPENERS:
+            raise ParsingException(f'Unknown compression {compression}, expected one of {", ".join(OPENERS)}')
+        return OPENERS[compression](f, 'rt', encoding=encoding)
+    if isinstance(f, (str, os.PathLike)):
+        return open(f, encoding=encoding)
+    return io.TextIOWrapper(f, encoding=encoding)
+
+
+def parse_from_lines(lines, executor=None, chunksize=1, **kwargs):
+    if executor is not None:
+        return ParallelParser(lines, executor, chunksize=chunksize, **kwargs).parse()
 
-def parse_from_lines(lines, **kwargs):
     helper = IteratorHelper(lines)
-    parser = Bai2FileParser(helper, **kwargs)
+    parser = StateMachineParser(helper, **kwargs)
     return parser.parse()
 
 
+def iter_events(lines, pipelined=False, **kwargs):
+    if pipelined:
+        return PipelinedParser(lines, **kwargs).iter_events()
+
+    helper = IteratorHelper(lines)
+    parser = StateMachineParser(helper, **kwargs)
+    return parser.iter_events()
+
+
 def parse_from_string(s, **kwargs):
     lines = filter(None, (line.strip() for line in s.splitlines()))
     return parse_from_lines(lines, **kwargs)
 
 
-def parse_from_file(f, **kwargs):
-    return parse_from_string(f.read(), **kwargs)
+def parse_from_file(f, buffer_size=io.DEFAULT_BUFFER_SIZE, **kwargs):
+    return parse_from_lines(read_lines(f, buffer_size), **kwargs)
+
+
+def parse_from_buffer(buffer, encoding='utf-8', **kwargs):
+    generator = functools.partial(buffer_record_generator, encoding=encoding)
+    helper = IteratorHelper(buffer, generator=generator)
+    parser = StateMachineParser(helper, **kwargs)
+    return parser.parse()
+
+
+def parse_from_path(
+    path, encoding=None, buffer_size=io.DEFAULT_BUFFER_SIZE, use_mmap=False, compression=None, **kwargs,
+):
+    if compression is None:
+        compression = _get_compression(path)
+
+    # compressed files are always streamed through decompression and executors are sent lines
+    if use_mmap and compression is None and kwargs.get('executor') is None:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return parse_from_buffer(buffer, encoding=encoding or 'utf-8', **kwargs)
+
+    with _open_text(path, encoding=encoding, compression=compression) as f:
+        return parse_from_file(f, buffer_size=buffer_size, **kwargs)
+
+
+def _iter_archive_members(archive):
+    is_path = isinstance(archive, (str, os.PathLike))
+    # probing a file object for a zip file moves it
+    position = None if is_path else archive.tell()
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as zip_file:
+            for info in zip_file.infolist():
+                if not info.is_dir():
+                    with zip_file.open(info) as f:
+                        yield info.filename, f
+        return
+
+    if is_path:
+        tar_file = tarfile.open(archive)
+    else:
+        archive.seek(position)
+        tar_file = tarfile.open(fileobj=archive)
+    # members are read one by one as the archive is iterated, compressed tar files included
+    with tar_file:
+        for member in tar_file:
+            if member.isfile():
+                with tar_file.extractfile(member) as f:
+                    yield member.name, f
+
+
+def iter_from_archive(archive, encoding='utf-8', buffer_size=io.DEFAULT_BUFFER_SIZE, **kwargs):
+    """
+    Lazily parses the files in a zip or tar archive, given as a path or a binary file object,
+    yielding the name of each member and its Bai2File one member at a time.
+    Members with a .gz, .bz2, .xz or .lzma suffix are decompressed as they're read.
+    """
+    for name, member in _iter_archive_members(archive):
+        with _open_text(member, encoding=encoding, compression=_get_compression(name)) as f:
+            bai2_file = parse_from_file(f, buffer_size=buffer_size, **kwargs)
+        yield name, bai2_file
+
+
+def aparse(source, encoding='utf-8', buffer_size=io.DEFAULT_BUFFER_SIZE, **kwargs):
+    """
+    Asynchronously generates the events of a file read from an asyncio.StreamReader
+    or an async iterable of chunks of bytes or text.
+    """
+    lines = aread_lines(source, encoding=encoding, buffer_size=buffer_size)
+    return AsyncParser(lines, **kwargs).iter_events()
+
+
+async def aparse_file(source, encoding='utf-8', buffer_size=io.DEFAULT_BUFFER_SIZE, **kwargs):
+    """
+    Asynchronously parses a file read from an asyncio.StreamReader or an async iterable of chunks of bytes or text.
+    """
+    lines = aread_lines(source, encoding=encoding, buffer_size=buffer_size)
+    return await AsyncParser(lines, **kwargs).parse()
+
+
+def parse_paths(paths, options):
+    # runs in an executor's worker, exceptions are returned with the path that raised them
+    results = []
+    for path in paths:
+        start = time.perf_counter()
+        try:
+            bai2_file, exception = parse_from_path(path, **options), None
+        except Exception as e:
+            bai2_file, exception = None, e
+        results.append(ParseResult(path, bai2_file, exception, time.perf_counter() - start))
+    return results
+
+
+def parse_many(paths, workers=None, ordered=True, chunksize=1, executor=None, **kwargs):
+    """
+    Parses files in the workers of a process pool, or of the given executor, sent chunksize paths at a time,
+    and yields a ParseResult for each, in the order of the paths or as they're parsed if not ordered.
+    """
+    paths = list(paths)
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    futures = []
+    try:
+        for start in range(0, len(paths), chunksize):
+            futures.append(executor.submit(parse_paths, paths[start:start + chunksize], kwargs))
+        for future in futures if ordered else as_completed(futures):
+            yield from future.result()
+    finally:
+        # the files not parsed yet when the results stop being read are left alone
+        for future in futures:
+            future.cancel()
+        if own_executor:
+            executor.shutdown()
 
 
 def write(bai2_obj, **kwargs):
     return '\n'.join(Bai2FileWriter(bai2_obj, **kwargs).write())
+
+
+def write_bytes(bai2_obj, encoding='utf-8', line_terminator='\n', compression=None, **kwargs):
+    writer = Bai2FileWriter(bai2_obj, **kwargs)
+    return b''.join(writer.iter_bytes(encoding=encoding, line_terminator=line_terminator, compression=compression))
+
+
+def write_to_file(bai2_obj, f, encoding='utf-8', line_terminator='\n', compression=None, **kwargs):
+    writer = Bai2FileWriter(bai2_obj, **kwargs)
+    return writer.write_to(f, encoding=encoding, line_terminator=line_terminator, compression=compression)
+
+
+def write_to_path(bai2_obj, path, encoding='utf-8', line_terminator='\n', compression=None, **kwargs):
+    if compression is None:
+        compression = _get_compression(path)
+    with open(path, 'wb') as f:
+        return write_to_file(
+            bai2_obj, f, encoding=encoding, line_terminator=line_terminator, compression=compression, **kwargs,
+        )
+
+
+def write_blocked(bai2_obj, target, encoding='utf-8', block_separator=b'', **kwargs):
+    return Bai2FileWriter(bai2_obj, **kwargs).write_blocked(target, encoding=encoding, block_separator=block_separator)
@@ -15,6 +15,16 @@ class RecordCode(Enum):
     file_trailer = '99'
 
 
+class EventType(Enum):
+    file_header = 'file_header'
+    group_start = 'group_start'
+    account_start = 'account_start'
+    transaction = 'transaction'
+    account_end = 'account_end'
+    group_end = 'group_end'
+    file_end = 'file_end'
+
+
 class GroupStatus(Enum):
     update = '1'
     deletion = '2'
@@ -0,0 +1,96 @@
+import datetime
+import functools
+import re
+
+# files repeat the same few dates and times many times
+CACHE_SIZE = 1024
+
+CLOCK_PATTERN = re.compile(r'\d\d:\d\d:\d\d')
+
+DIGITS_PATTERN = re.compile(r'[0-9]+')
+
+
+def _is_digits(value):
+    # str.isdigit() also accepts digits of other scripts
+    return DIGITS_PATTERN.fullmatch(value) is not None
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def parse_date(value):
+    """
+    YYMMDD Format.
+    """
+    if len(value) == 6 and _is_digits(value):
+        year = int(value[:2])
+        # same pivot as %y
+        year += 1900 if year >= 69 else 2000
+        try:
+            return datetime.date(year, int(value[2:4]), int(value[4:]))
+        except ValueError:
+            pass
+    # anything unusual goes through strptime for the same leniency and errors
+    return datetime.datetime.strptime(value, '%y%m%d').date()
+
+
+def write_date(date):
+    return f'{date.year % 100:02d}{date.month:02d}{date.day:02d}'
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def parse_time(value):
+    if CLOCK_PATTERN.match(value):
+        return parse_clock_time(value)
+    else:
+        return parse_military_time(value)
+
+
+def parse_clock_time(value):
+    if (
+        len(value) == 8 and value[2] == ':' and value[5] == ':'
+        and _is_digits(value[:2] + value[3:5] + value[6:])
+    ):
+        try:
+            return datetime.time(int(value[:2]), int(value[3:5]), int(value[6:]))
+        except ValueError:
+            pass
+    return datetime.datetime.strptime(value, '%H:%M:%S').time()
+
+
+def parse_military_time(value):
+    """
+    Military Format, 24 hours. 0001 through 2400.
+    Times are stated in military format (0000 through 2400).
+    0000 indicates the beginning of the day and 2400 indicates the end of the day
+    for the date indicated.
+    Some processors use 9999 to indicate the end of the day.
+    Be prepared to recognize 9999 as end-of-day when receiving transmissions.
+    """
+    # 9999 indicates end of the day
+    # 2400 indicates end of the day but 24:00 not allowed so
+    # it's really 23:59
+    if value == '9999' or value == '2400':
+        return datetime.time.max
+    if len(value) == 4 and _is_digits(value):
+        try:
+            return datetime.time(int(value[:2]), int(value[2:]))
+        except ValueError:
+            pass
+    return datetime.datetime.strptime(value, '%H%M').time()
+
+
+def write_time(time, clock_format_for_intra_day=False):
+    if clock_format_for_intra_day and time != datetime.time.max:
+        return write_clock_time(time)
+    else:
+        return write_military_time(time)
+
+
+def write_clock_time(time):
+    return f'{time.hour:02d}:{time.minute:02d}:{time.second:02d}'
+
+
+def write_military_time(time):
+    if time == datetime.time.max:
+        return '2400'
+    else:
+        return f'{time.hour:02d}{time.minute:02d}'
@@ -8,3 +8,7 @@ class NotSupportedYetException(Exception):
 
 class IntegrityException(Exception):
     pass
+
+
+class WritingException(Exception):
+    pass
@@ -1,9 +1,17 @@
-from .constants import RecordCode
+import codecs
+import collections
+import io
+import itertools
+import queue
+import re
+import time
+
+from .constants import CONTINUATION_CODE, RecordCode
 from .models import Record
 
 
 def _build_account_identifier_record(rows):
-    fields_str = ''
+    parts = []
     for index, row in enumerate(rows):
         field_str = row[1]
         commas_count = field_str.count(',')
@@ -14,30 +22,40 @@ def _build_account_identifier_record(rows):
 
         if field_str:
             if field_str[-1] == '/':
-                fields_str += field_str[:-1]
+                parts.append(field_str[:-1])
                 if summary_commas_count % 4 != 0:
                     # if the number of commas is not a multiple of 4, then we need to add a comma
                     # some banks emit this extra comma, some don't, so we need to normalize it
-                    fields_str += ','
+                    parts.append(',')
             else:
-                fields_str += field_str
+                parts.append(field_str)
 
-    fields = fields_str.split(',')
+    # joined once as records can have long chains of continuations
+    fields = ''.join(parts).split(',')
     return Record(code=rows[0][0], fields=fields, rows=rows)
 
 
 def _build_generic_record(rows):
-    fields_str = ''
+    if len(rows) == 1:
+        field_str = rows[0][1]
+        if field_str[-1:] == '/':
+            field_str = field_str[:-1]
+        return Record(code=rows[0][0], fields=field_str.split(','), rows=rows)
+
+    parts = []
     for row in rows:
         field_str = row[1]
 
         if field_str:
             if field_str[-1] == '/':
-                fields_str += field_str[:-1] + ','
+                parts.append(field_str[:-1])
+                parts.append(',')
             else:
-                fields_str += field_str + ' '
+                parts.append(field_str)
+                parts.append(' ')
 
-    fields = fields_str[:-1].split(',')
+    # joined once as records can have long chains of continuations
+    fields = ''.join(parts[:-1]).split(',')
     return Record(code=rows[0][0], fields=fields, rows=rows)
 
 
@@ -57,11 +75,7 @@ def _build_record(rows):
     return RecordBuilderFactory[record_code](rows)
 
 
-def record_generator(lines):
-    rows = (
-        (RecordCode(line[:2]), line[3:]) for line in lines
-    )
-
+def _group_rows(rows):
     records = [next(rows)]
     while True:
         try:
@@ -78,9 +92,376 @@ def record_generator(lines):
     yield _build_record(records)
 
 
+def get_fixed_record_length(first_line):
+    """
+    Returns the physical record length set in the 01 record starting the first line
+    when the line holds several fixed length records rather than one, otherwise None.
+    """
+    fields = first_line.split(',', 8)
+    if len(fields) < 8 or fields[0] != RecordCode.file_header.value or not fields[6].isdigit():
+        return None
+
+    record_length = int(fields[6])
+    # the whole 01 record has to fit in the first of the records
+    if record_length < len(first_line.rstrip()) and first_line[:record_length].count(',') >= 8:
+        return record_length
+    return None
+
+
+def _split_fixed_length_lines(lines, record_length):
+    for line in lines:
+        for start in range(0, len(line), record_length):
+            # padding is only trimmed as each record is read
+            record = line[start:start + record_length].strip()
+            if record:
+                yield record
+
+
+def split_fixed_length_lines(lines):
+    """
+    Splits lines holding fixed length records, as detected from the 01 record,
+    into one line per record. Other lines are returned as they are.
+    """
+    lines = iter(lines)
+    first_line = next(lines, None)
+    if first_line is None:
+        return iter(())
+
+    lines = itertools.chain([first_line], lines)
+    record_length = get_fixed_record_length(first_line)
+    if record_length is None:
+        return lines
+    return _split_fixed_length_lines(lines, record_length)
+
+
+def record_generator(lines):
+    rows = (
+        (RecordCode(line[:2]), line[3:]) for line in split_fixed_length_lines(lines)
+    )
+    return _group_rows(rows)
+
+
+_BYTES_RECORD_CODES = {
+    record_code.value.encode(): record_code
+    for record_code in RecordCode
+}
+
+
+# enough of a buffer to hold the fields of the 01 record up to the block size
+_HEADER_SIZE = 1024
+
+
+def _decode_row(line, encoding):
+    code = line[:2]
+    try:
+        record_code = _BYTES_RECORD_CODES[code]
+    except KeyError:
+        record_code = RecordCode(code.decode(encoding))
+    return record_code, line[3:].decode(encoding)
+
+
+def _buffer_rows(buffer, encoding):
+    for match in re.finditer(rb'[^\r\n]+', buffer):
+        line = match.group().strip()
+        if line:
+            yield _decode_row(line, encoding)
+
+
+def _fixed_length_buffer_rows(buffer, encoding, record_length):
+    # the records of a line start after its leading whitespace, as they do once lines are stripped
+    for match in re.finditer(rb'\s*([^\r\n]+)', buffer):
+        # sliced by offsets so that lines of many records aren't copied as a whole
+        end = match.end(1)
+        for start in range(match.start(1), end, record_length):
+            line = bytes(buffer[start:min(start + record_length, end)]).strip()
+            if line:
+                yield _decode_row(line, encoding)
+
+
+def buffer_record_generator(buffer, encoding='utf-8'):
+    """
+    Generates records from a bytes-like object such as bytes, memoryview or mmap.mmap,
+    decoding one row at a time rather than the whole buffer.
+    Fixed length records are detected from the 01 record.
+    """
+    head = bytes(buffer[:_HEADER_SIZE]).decode(encoding, errors='ignore').lstrip()
+    record_length = get_fixed_record_length(head.splitlines()[0] if head else head)
+    if record_length is None:
+        return _group_rows(_buffer_rows(buffer, encoding))
+    return _group_rows(_fixed_length_buffer_rows(buffer, encoding, record_length))
+
+
+def _clean_lines(lines):
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield line
+
+
+class LineSplitter:
+    """
+    Splits chunks of text into their non-blank lines, stripped of surrounding whitespace,
+    lines continuing over several chunks are returned once they end.
+    Lines of fixed length records, as detected from the 01 record, are split into one line per record
+    as the records are read, so that lines as long as the file aren't held whole.
+    """
+
+    def __init__(self):
+        # parts of a line continuing over several chunks, joined once it ends
+        self._remainder = []
+        self._remainder_length = 0
+        # the record length is detected from the first non-blank line, or from its start while it continues
+        self._first_line = True
+        self._detected_length = 0
+        self.record_length = None
+        self._line_start = True
+
+    def feed(self, chunk):
+        if not chunk:
+            return []
+
+        lines = chunk.splitlines(keepends=True)
+        if self._first_line:
+            return self._feed_first_line(lines)
+        if self.record_length is not None:
+            return self._feed_records(lines)
+        return self._feed_lines(lines)
+
+    def _feed_first_line(self, lines):
+        for index, line in enumerate(lines):
+            self._remainder.append(line)
+            self._remainder_length += len(line)
+            if len(line.splitlines()[0]) == len(line):
+                continue
+
+            first_line = ''.join(self._remainder)
+            self._remainder = []
+            self._remainder_length = 0
+            if first_line.strip():
+                self._first_line = False
+                self.record_length = get_fixed_record_length(first_line.strip())
+                return self.feed(''.join([first_line] + lines[index + 1:]))
+
+        # the start of a line of fixed length records is enough to detect them,
+        # tried again each time the line doubles in length
+        if self._remainder_length >= 2 * self._detected_length:
+            start = ''.join(self._remainder).lstrip()
+            self._remainder = [start]
+            self._remainder_length = self._detected_length = len(start)
+            record_length = get_fixed_record_length(start)
+            if record_length is not None:
+                self._first_line = False
+                self.record_length = record_length
+                self._remainder = []
+                return self._feed_records([start])
+        return []
+
+    def _feed_lines(self, lines):
+        # the last line might continue in the next chunk
+        last_line = lines[-1]
+        last_line_continues = len(last_line.splitlines()[0]) == len(last_line)
+        if last_line_continues and len(lines) == 1:
+            self._remainder.append(last_line)
+            return []
+
+        if self._remainder:
+            self._remainder.append(lines[0])
+            lines[0] = ''.join(self._remainder)
+        self._remainder = [lines.pop()] if last_line_continues else []
+        return list(_clean_lines(lines))
+
+    def _feed_records(self, lines):
+        records = []
+        for line in lines:
+            # the remainder is shorter than a record
+            text = ''.join(self._remainder) + line
+            if self._line_start:
+                text = text.lstrip()
+            if len(line.splitlines()[0]) == len(line):
+                # the line continues, only whole records are split from it
+                self._line_start = self._line_start and not text
+                end = len(text) - len(text) % self.record_length
+                self._remainder = [text[end:]]
+                text = text[:end]
+            else:
+                self._line_start = True
+                self._remainder = []
+            records += _split_fixed_length_lines([text], self.record_length)
+        return records
+
+    def close(self):
+        # ends the last line
+        return self.feed('\n')
+
+
+def read_lines(f, buffer_size=io.DEFAULT_BUFFER_SIZE):
+    """
+    Lazily reads the non-blank lines of a file object, stripped of surrounding whitespace,
+    reading at most buffer_size characters at a time.
+    """
+    splitter = LineSplitter()
+    while True:
+        chunk = f.read(buffer_size)
+        if not chunk:
+            break
+        yield from splitter.feed(chunk)
+    yield from splitter.close()
+
+
+async def _aiter_chunks(source, buffer_size):
+    if hasattr(source, 'read'):
+        while True:
+            chunk = await source.read(buffer_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        async for chunk in source:
+            yield chunk
+
+
+async def aread_lines(source, encoding='utf-8', buffer_size=io.DEFAULT_BUFFER_SIZE):
+    """
+    Lazily reads the non-blank lines, stripped of surrounding whitespace, of an asyncio.StreamReader
+    read buffer_size bytes at a time or of an async iterable of chunks of bytes or text.
+    Bytes are decoded with the given encoding.
+    """
+    splitter = LineSplitter()
+    decoder = codecs.getincrementaldecoder(encoding)()
+    async for chunk in _aiter_chunks(source, buffer_size):
+        if not isinstance(chunk, str):
+            chunk = decoder.decode(chunk)
+        for line in splitter.feed(chunk):
+            yield line
+
+    for line in splitter.feed(decoder.decode(b'', final=True)) + splitter.close():
+        yield line
+
+
+class LineQueue:
+    """
+    Lines read ahead from an async iterator for parsers pulling them synchronously.
+    A step of a parser can need the lines up to the start of the record after the next one,
+    fill() reads read_ahead records ahead once there aren't enough left.
+    Fixed length records are split as they are read, as detected from the 01 record.
+    """
+
+    def __init__(self, lines, read_ahead=256):
+        self._lines = lines.__aiter__()
+        self.read_ahead = read_ahead
+        self._queue = collections.deque()
+        self._number_of_record_starts = 0
+        self._record_length = None
+        self._first_line = True
+        self.exhausted = False
+
+    def _append(self, line):
+        if self._first_line:
+            self._first_line = False
+            self._record_length = get_fixed_record_length(line)
+        lines = [line] if self._record_length is None else _split_fixed_length_lines([line], self._record_length)
+        for line in lines:
+            self._queue.append(line)
+            if line[:2] != CONTINUATION_CODE:
+                self._number_of_record_starts += 1
+
+    @property
+    def needs_filling(self):
+        return self._number_of_record_starts < 2 and not self.exhausted
+
+    async def fill(self):
+        while self._number_of_record_starts < self.read_ahead and not self.exhausted:
+            try:
+                line = await self._lines.__anext__()
+            except StopAsyncIteration:
+                self.exhausted = True
+            else:
+                self._append(line)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self._queue:
+            if not self.exhausted:
+                raise RuntimeError('Lines have to be read ahead with fill()')
+            raise StopIteration
+        line = self._queue.popleft()
+        if line[:2] != CONTINUATION_CODE:
+            self._number_of_record_starts -= 1
+        return line
+
+
+class StageQueue:
+    """
+    Bounded queue passing batches between two stages of a pipeline, a stage putting into a full queue
+    waits for room. Keeps metrics of its depth and of the seconds the stages spent waiting on it.
+    """
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self._queue = queue.Queue(maxsize)
+        self.number_of_batches = 0
+        self.max_depth = 0
+        self._total_depth = 0
+        # time the stage filling the queue waited for room and the stage emptying it waited for batches
+        self.put_wait = 0.0
+        self.get_wait = 0.0
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    @property
+    def mean_depth(self):
+        """
+        Mean number of batches already queued when a batch was put.
+        """
+        if not self.number_of_batches:
+            return 0.0
+        return self._total_depth / self.number_of_batches
+
+    def put(self, item, stopped, timeout=0.1):
+        """
+        Returns False if stopped is set while waiting for room.
+        """
+        depth = self._queue.qsize()
+        self.number_of_batches += 1
+        self._total_depth += depth
+        self.max_depth = max(self.max_depth, depth)
+
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    self._queue.put(item, timeout=timeout)
+                    return True
+                except queue.Full:
+                    if stopped.is_set():
+                        return False
+        finally:
+            self.put_wait += time.perf_counter() - start
+
+    def get(self, stopped, timeout=0.1):
+        """
+        Returns None if stopped is set while waiting for a batch.
+        """
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    return self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    if stopped.is_set():
+                        return None
+        finally:
+            self.get_wait += time.perf_counter() - start
+
+
 class IteratorHelper:
-    def __init__(self, lines):
-        self._generator = record_generator(lines)
+    def __init__(self, lines, generator=record_generator):
+        self._generator = generator(lines)
         self.current_record = None
         self.advance()
 
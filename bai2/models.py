@@ -1,72 +1,246 @@
+import operator
+from collections import namedtuple
+
 from .constants import RecordCode
 
 # ABSTRACTION
 
 
 class Record:
+    __slots__ = ('code', 'fields', 'rows')
+
     def __init__(self, code, fields, rows=None):
         self.code = code
         self.fields = fields
         self.rows = rows or []
 
 
+# an event generated while streaming a file, obj is the model just parsed
+Event = namedtuple('Event', ['type', 'obj'])
+
+# the outcome of parsing one of many files, bai2_file or exception is None, duration in seconds
+ParseResult = namedtuple('ParseResult', ['path', 'bai2_file', 'exception', 'duration'])
+
+
 class Bai2Model:
+    __slots__ = ()
     code = None
 
     def as_string(self):
-        return '\n'.join([
+        return '\n'.join(self.as_lines())
+
+    def as_lines(self):
+        return [
             f'{row[0].value},{row[1]}'
             for row in self.rows
-        ])
+        ]
+
+
+def _get_fields_getter(cls):
+    """
+    Returns a function getting the fields of instances of a Bai2SingleModel subclass: the slots declared
+    by any of its classes, bar the bookkeeping ones, and the attributes in the instance's __dict__ if it has one.
+    """
+    names = []
+    has_dict = False
+    all_set = True
+    for klass in reversed(cls.__mro__):
+        has_dict = has_dict or ('__dict__' in vars(klass) and klass is not object)
+        slots = vars(klass).get('__slots__', ())
+        for name in (slots,) if isinstance(slots, str) else slots:
+            if name not in names and name not in _BOOKKEEPING_SLOTS:
+                names.append(name)
+                # the models of this module set all their fields, those of subclasses might be left unset
+                all_set = all_set and klass.__module__ == __name__
+
+    if len(names) > 1 and all_set:
+        get_slots = operator.attrgetter(*names)
+    else:
+        def get_slots(obj):
+            return tuple(getattr(obj, name, None) for name in names)
+
+    if not has_dict:
+        return get_slots
+    return lambda obj: (get_slots(obj), dict(obj.__dict__))
 
 
 class Bai2SingleModel(Bai2Model):
+    # subclasses list their fields in __slots__ as there can be millions of instances
+    __slots__ = ('rows', '_number_of_rows', '_original_fields')
+
     def __init__(self, rows=None, **fields):
         self.rows = rows or []
+        self._number_of_rows = None
+        self._original_fields = None
         for name, value in fields.items():
             setattr(self, name, value)
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._get_fields = staticmethod(_get_fields_getter(cls))
+
+    def _fields_snapshot(self):
+        return self._get_fields(self)
+
+    def track_changes(self):
+        """
+        Remembers the current fields, the record is then modified if any of them change.
+        """
+        self._original_fields = self._fields_snapshot()
+
+    @property
+    def modified(self):
+        """
+        Whether the fields might not match the rows, always the case for records whose changes aren't tracked.
+        """
+        return self._original_fields is None or self._original_fields != self._fields_snapshot()
+
+    @property
+    def number_of_rows(self):
+        """
+        Number of rows of the record in the file, still known once rows are discarded.
+        """
+        if self._number_of_rows is None:
+            return len(self.rows)
+        return self._number_of_rows
+
+    def discard_rows(self):
+        self._number_of_rows = self.number_of_rows
+        self._original_fields = None
+        self.rows = ()
+
+
+_BOOKKEEPING_SLOTS = (*Bai2SingleModel.__slots__, '__dict__', '__weakref__')
+
 
 class Bai2SectionModel(Bai2Model):
+    control_total_field = None
+
     def __init__(self, header=None, trailer=None, children=None):
         self.header = header
         self.trailer = trailer
         self.children = children
+        self.parent = None
+        # number of children when the add and remove methods last updated the totals
+        self._totals_children_count = None
+
+    def __getstate__(self):
+        # sections are pickled without their parent, which links them back when unpickled
+        return {**self.__dict__, 'parent': None}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for child in self.children:
+            if isinstance(child, Bai2SectionModel):
+                child.parent = self
 
     def update_totals(self):
         pass
 
+    @property
+    def totals_outdated(self):
+        """
+        Whether the totals in the trailer need updating, they are kept up to date
+        by the add and remove methods until the children are changed directly.
+        """
+        return self._totals_children_count != len(self.children)
+
+    def ensure_totals(self):
+        """
+        Updates the totals in the trailer unless they're being kept up to date.
+        """
+        if self.totals_outdated:
+            self.update_totals()
+
+    def _track_totals(self, ancestors=True):
+        # the totals are updated once, children first, and then kept up to date
+        if self.totals_outdated:
+            for child in self.children:
+                if isinstance(child, Bai2SectionModel):
+                    child._track_totals(ancestors=False)
+            self.update_totals()
+            self._totals_tracked()
+        if ancestors and self.parent is not None:
+            self.parent._track_totals()
+
+    def _totals_tracked(self):
+        self._totals_children_count = len(self.children)
+
+    def _set_control_total(self, control_total):
+        previous_control_total = getattr(self.trailer, self.control_total_field)
+        setattr(self.trailer, self.control_total_field, control_total)
+        parent = self.parent
+        if parent is not None and previous_control_total is not None and not parent.totals_outdated:
+            parent._change_control_total(control_total - previous_control_total)
+
+    def _change_control_total(self, amount):
+        self._set_control_total(getattr(self.trailer, self.control_total_field) + amount)
+
+    def _add_section(self, section):
+        self._track_totals()
+        section._track_totals(ancestors=False)
+        section.parent = self
+        self.children.append(section)
+        self._totals_tracked()
+        self._change_control_total(getattr(section.trailer, section.control_total_field))
+
     @property
     def rows(self):
         if not hasattr(self, '_rows'):
-            rows = self.header.rows
+            rows = list(self.header.rows)
             for child in self.children:
                 rows += child.rows
             rows += self.trailer.rows
             self._rows = rows
         return self._rows
 
+    @property
+    def number_of_rows(self):
+        number_of_rows = self.header.number_of_rows + self.trailer.number_of_rows
+        for child in self.children:
+            number_of_rows += child.number_of_rows
+        return number_of_rows
+
 
 # IMPLEMENTATION
 
 
 class Bai2File(Bai2SectionModel):
+    control_total_field = 'file_control_total'
+
     def __init__(self, header=None, trailer=None, children=None):
         super().__init__(header=header or Bai2FileHeader([]),
                          trailer=trailer or Bai2FileTrailer([]),
                          children=children or [])
+        for child in self.children:
+            child.parent = self
 
     def update_totals(self):
         file_control_total = 0
         for group in self.children:
+            group.parent = self
             file_control_total += group.trailer.group_control_total
 
-        self.trailer.file_control_total = file_control_total
+        self._set_control_total(file_control_total)
+        self.trailer.number_of_groups = len(self.children)
+
+    def add_group(self, group):
+        self._add_section(group)
         self.trailer.number_of_groups = len(self.children)
 
 
 class Bai2FileHeader(Bai2SingleModel):
     code = RecordCode.file_header
+    __slots__ = (
+        'sender_id',
+        'receiver_id',
+        'creation_date',
+        'creation_time',
+        'file_id',
+        'physical_record_length',
+        'block_size',
+        'version_number',
+    )
 
     def __init__(
         self,
@@ -80,16 +254,24 @@ class Bai2FileHeader(Bai2SingleModel):
         block_size=None,
         version_number=2,
     ):
-        super().__init__(
-            rows, sender_id=sender_id, receiver_id=receiver_id,
-            creation_date=creation_date, creation_time=creation_time,
-            file_id=file_id, physical_record_length=physical_record_length,
-            block_size=block_size, version_number=version_number,
-        )
+        super().__init__(rows)
+        self.sender_id = sender_id
+        self.receiver_id = receiver_id
+        self.creation_date = creation_date
+        self.creation_time = creation_time
+        self.file_id = file_id
+        self.physical_record_length = physical_record_length
+        self.block_size = block_size
+        self.version_number = version_number
 
 
 class Bai2FileTrailer(Bai2SingleModel):
     code = RecordCode.file_trailer
+    __slots__ = (
+        'file_control_total',
+        'number_of_groups',
+        'number_of_records',
+    )
 
     def __init__(
         self,
@@ -98,29 +280,47 @@ class Bai2FileTrailer(Bai2SingleModel):
         number_of_groups=None,
         number_of_records=None,
     ):
-        super().__init__(
-            rows, file_control_total=file_control_total,
-            number_of_groups=number_of_groups, number_of_records=number_of_records,
-        )
+        super().__init__(rows)
+        self.file_control_total = file_control_total
+        self.number_of_groups = number_of_groups
+        self.number_of_records = number_of_records
 
 
 class Group(Bai2SectionModel):
+    control_total_field = 'group_control_total'
+
     def __init__(self, header=None, trailer=None, children=None):
         super().__init__(header=header or GroupHeader([]),
                          trailer=trailer or GroupTrailer([]),
                          children=children or [])
+        for child in self.children:
+            child.parent = self
 
     def update_totals(self):
         group_control_total = 0
         for account in self.children:
+            account.parent = self
             group_control_total += account.trailer.account_control_total
 
-        self.trailer.group_control_total = group_control_total
+        self._set_control_total(group_control_total)
+        self.trailer.number_of_accounts = len(self.children)
+
+    def add_account(self, account):
+        self._add_section(account)
         self.trailer.number_of_accounts = len(self.children)
 
 
 class GroupHeader(Bai2SingleModel):
     code = RecordCode.group_header
+    __slots__ = (
+        'ultimate_receiver_id',
+        'originator_id',
+        'group_status',
+        'as_of_date',
+        'as_of_time',
+        'currency',
+        'as_of_date_modifier',
+    )
 
     def __init__(
         self,
@@ -133,16 +333,23 @@ class GroupHeader(Bai2SingleModel):
         currency=None,
         as_of_date_modifier=None,
     ):
-        super().__init__(
-            rows, ultimate_receiver_id=ultimate_receiver_id,
-            originator_id=originator_id, group_status=group_status,
-            as_of_date=as_of_date, as_of_time=as_of_time, currency=currency,
-            as_of_date_modifier=as_of_date_modifier,
-        )
+        super().__init__(rows)
+        self.ultimate_receiver_id = ultimate_receiver_id
+        self.originator_id = originator_id
+        self.group_status = group_status
+        self.as_of_date = as_of_date
+        self.as_of_time = as_of_time
+        self.currency = currency
+        self.as_of_date_modifier = as_of_date_modifier
 
 
 class GroupTrailer(Bai2SingleModel):
     code = RecordCode.group_trailer
+    __slots__ = (
+        'group_control_total',
+        'number_of_accounts',
+        'number_of_records',
+    )
 
     def __init__(
         self,
@@ -151,14 +358,15 @@ class GroupTrailer(Bai2SingleModel):
         number_of_accounts=None,
         number_of_records=None,
     ):
-        super().__init__(
-            rows, group_control_total=group_control_total,
-            number_of_accounts=number_of_accounts,
-            number_of_records=number_of_records,
-        )
+        super().__init__(rows)
+        self.group_control_total = group_control_total
+        self.number_of_accounts = number_of_accounts
+        self.number_of_records = number_of_records
 
 
 class Account(Bai2SectionModel):
+    control_total_field = 'account_control_total'
+
     def __init__(self, header=None, trailer=None, children=None):
         super().__init__(header=header or AccountIdentifier([]),
                          trailer=trailer or AccountTrailer([]),
@@ -171,11 +379,28 @@ class Account(Bai2SectionModel):
         for summary in self.header.summary_items:
             account_control_total += summary.amount
 
-        self.trailer.account_control_total = account_control_total
+        self._set_control_total(account_control_total)
+
+    def add_transaction(self, transaction):
+        self._track_totals()
+        self.children.append(transaction)
+        self._totals_tracked()
+        self._change_control_total(transaction.amount)
+
+    def remove_transaction(self, transaction):
+        self._track_totals()
+        self.children.remove(transaction)
+        self._totals_tracked()
+        self._change_control_total(-transaction.amount)
 
 
 class AccountIdentifier(Bai2SingleModel):
     code = RecordCode.account_identifier
+    __slots__ = (
+        'customer_account_number',
+        'currency',
+        'summary_items',
+    )
 
     def __init__(
         self,
@@ -185,13 +410,19 @@ class AccountIdentifier(Bai2SingleModel):
         summary_items=(),
     ):
         summary_items = list(summary_items)
-        super().__init__(
-            rows, customer_account_number=customer_account_number,
-            currency=currency, summary_items=summary_items,
-        )
+        super().__init__(rows)
+        self.customer_account_number = customer_account_number
+        self.currency = currency
+        self.summary_items = summary_items
+
+    def _fields_snapshot(self):
+        # as are the summaries
+        return self._get_fields(self), tuple(summary._fields_snapshot() for summary in self.summary_items)
 
 
 class Summary:
+    __slots__ = ('type_code', 'amount', 'item_count', 'funds_type', 'availability')
+
     def __init__(
         self,
         type_code=None,
@@ -206,9 +437,20 @@ class Summary:
         self.funds_type = funds_type
         self.availability = availability
 
+    def _fields_snapshot(self):
+        availability = self.availability
+        return _get_summary_fields(self), tuple(availability.items()) if availability else availability
+
+
+_get_summary_fields = operator.attrgetter(*Summary.__slots__)
+
 
 class AccountTrailer(Bai2SingleModel):
     code = RecordCode.account_trailer
+    __slots__ = (
+        'account_control_total',
+        'number_of_records',
+    )
 
     def __init__(
         self,
@@ -216,14 +458,22 @@ class AccountTrailer(Bai2SingleModel):
         account_control_total=None,
         number_of_records=None,
     ):
-        super().__init__(
-            rows, account_control_total=account_control_total,
-            number_of_records=number_of_records,
-        )
+        super().__init__(rows)
+        self.account_control_total = account_control_total
+        self.number_of_records = number_of_records
 
 
 class TransactionDetail(Bai2SingleModel):
     code = RecordCode.transaction_detail
+    __slots__ = (
+        'type_code',
+        'amount',
+        'funds_type',
+        'availability',
+        'bank_reference',
+        'customer_reference',
+        'text',
+    )
 
     def __init__(
         self,
@@ -236,8 +486,16 @@ class TransactionDetail(Bai2SingleModel):
         customer_reference=None,
         text=None,
     ):
-        super().__init__(
-            rows, type_code=type_code, amount=amount, funds_type=funds_type,
-            availability=availability, bank_reference=bank_reference,
-            customer_reference=customer_reference, text=text,
-        )
+        super().__init__(rows)
+        self.type_code = type_code
+        self.amount = amount
+        self.funds_type = funds_type
+        self.availability = availability
+        self.bank_reference = bank_reference
+        self.customer_reference = customer_reference
+        self.text = text
+
+    def _fields_snapshot(self):
+        # the availability is copied so that changes made in place are noticed
+        availability = self.availability
+        return self._get_fields(self), tuple(availability.items()) if availability else availability
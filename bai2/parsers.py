@@ -1,7 +1,12 @@
+import asyncio
+import itertools
+import threading
 from collections import OrderedDict
 
-from .constants import AsOfDateModifier, FundsType, GroupStatus
+from .constants import CONTINUATION_CODE, AsOfDateModifier, EventType, FundsType, GroupStatus, RecordCode
+from .dates import parse_date, parse_time
 from .exceptions import IntegrityException, NotSupportedYetException, ParsingException
+from .helpers import IteratorHelper, LineQueue, StageQueue, record_generator, split_fixed_length_lines
 from .models import (
     Account,
     AccountIdentifier,
@@ -9,29 +14,74 @@ from .models import (
     Bai2File,
     Bai2FileHeader,
     Bai2FileTrailer,
+    Event,
     Group,
     GroupHeader,
     GroupTrailer,
     Summary,
     TransactionDetail,
 )
-from .utils import parse_date, parse_time, parse_type_code
+from .utils import parse_type_code
 
 # ABSTRACTION
 
 
+def compile_fields_decoder(fields_config):
+    """
+    Generates a function turning a sequence of raw values, read from an optional
+    offset onwards, into a dict of parsed fields.
+
+    Each item of fields_config is either a field name, whose value is kept as is,
+    or a tuple (field name, parser); blank values are parsed as None,
+    or 0 for integer totals.
+    """
+    namespace = {}
+    items = []
+    for index, field_config in enumerate(fields_config):
+        value = f'values[offset + {index}]' if index else 'values[offset]'
+        if isinstance(field_config, str):
+            items.append(f'{field_config!r}: {value} or None')
+            continue
+
+        field_name, parser = field_config
+        default = 0 if parser is int and 'total' in field_name else None
+        parser_name = f'parser_{index}'
+        namespace[parser_name] = parser
+        items.append(f'{field_name!r}: {parser_name}({value}) if {value} else {default!r}')
+
+    source = 'def decode(values, offset=0):\n    return {' + ', '.join(items) + '}\n'
+    exec(source, namespace)
+    return namespace['decode']
+
+
+class SectionTotals:
+    """
+    Aggregates of a section checked against the figures reported in its trailer.
+    """
+
+    def __init__(self, number_of_records=0, number_of_children=0, control_total=0):
+        self.number_of_records = number_of_records
+        self.number_of_children = number_of_children
+        self.control_total = control_total
+
+
 class BaseParser:
     model = None
     child_parser_class = None
 
-    def __init__(self, iterator, check_integrity=True):
+    def __init__(self, iterator, check_integrity=True, retain_rows=True, track_changes=False):
         """
         Keyword arguments:
         check_integrity -- checks the data integrity of the parsed file (default True)
+        retain_rows -- keeps the original rows in the parsed models (default True)
+        track_changes -- remembers the parsed fields so that unmodified records can be written as they were read
+                         (default False)
         """
         super().__init__()
         self._iter = iterator
         self.check_integrity = check_integrity
+        self.retain_rows = retain_rows
+        self.track_changes = track_changes
 
         self.child_parser = self._get_parser('child')
 
@@ -48,6 +98,8 @@ class BaseParser:
             return parser_clazz(
                 self._iter,
                 check_integrity=self.check_integrity,
+                retain_rows=self.retain_rows,
+                track_changes=self.track_changes,
             )
         return None
 
@@ -60,10 +112,19 @@ class BaseParser:
     def parse(self):
         raise NotImplementedError()
 
+    def iter_events(self):
+        """
+        Generates the events of the section being parsed and returns
+        a tuple (number of records consumed, parsed model).
+        """
+        raise NotImplementedError()
+
 
 class BaseSectionParser(BaseParser):
     header_parser_class = None
     trailer_parser_class = None
+    start_event_type = None
+    end_event_type = None
 
     def __init__(self, iterator, **kwargs):
         super().__init__(iterator, **kwargs)
@@ -94,22 +155,48 @@ class BaseSectionParser(BaseParser):
             or (self.child_parser and self.child_parser.can_parse())
         )
 
-    def validate_number_of_records(self, obj):
-        if self.check_integrity:
-            number_of_records = len(obj.header.rows) + len(obj.trailer.rows)
-            for child in obj.children:
-                number_of_records += len(child.rows)
+    def get_header_control_total(self, header):
+        return 0
+
+    def get_child_control_total(self, child):
+        return 0
+
+    def get_header_totals(self, header):
+        return SectionTotals(
+            number_of_records=header.number_of_rows,
+            control_total=self.get_header_control_total(header),
+        )
+
+    def add_child_totals(self, totals, number_of_records, child):
+        totals.number_of_records += number_of_records
+        totals.number_of_children += 1
+        totals.control_total += self.get_child_control_total(child)
+
+    def get_totals(self, obj):
+        if not self.check_integrity:
+            return SectionTotals(number_of_children=len(obj.children))
+
+        totals = self.get_header_totals(obj.header)
+        for child in obj.children:
+            self.add_child_totals(totals, child.number_of_rows, child)
+        totals.number_of_records += obj.trailer.number_of_rows
+        return totals
 
-            if number_of_records != obj.trailer.number_of_records:
+    def validate_number_of_records(self, trailer, totals):
+        if self.check_integrity:
+            if totals.number_of_records != trailer.number_of_records:
                 raise IntegrityException(
-                    f'Invalid number of records for {obj.__class__.__name__}. '
-                    f'expected {obj.trailer.number_of_records}, found {number_of_records}',
+                    f'Invalid number of records for {self.model.__name__}. '
+                    f'expected {trailer.number_of_records}, found {totals.number_of_records}',
                 )
 
+    def validate_totals(self, header, trailer, totals):
+        self.validate_number_of_records(trailer, totals)
+
     def validate(self, obj):
         super().validate(obj)
 
-        self.validate_number_of_records(obj)
+        self.validate_totals(obj.header, obj.trailer, self.get_totals(obj))
 
     def parse(self):
         header = self._parse_header()
@@ -122,81 +209,93 @@ class BaseSectionParser(BaseParser):
 
         return obj
 
+    def iter_events(self):
+        header = self._parse_header()
+        yield Event(self.start_event_type, header)
+
+        totals = self.get_header_totals(header)
+        if self.child_parser:
+            while self.child_parser.can_parse():
+                number_of_records, child = yield from self.child_parser.iter_events()
+                self.add_child_totals(totals, number_of_records, child)
+
+        trailer = self._parse_trailer()
+        totals.number_of_records += trailer.number_of_rows
+        self.validate_totals(header, trailer, totals)
+        yield Event(self.end_event_type, trailer)
+
+        # children are not retained, the parent only needs the trailer figures
+        return totals.number_of_records, self.build_model(header, [], trailer)
+
     def build_model(self, header, children, trailer):
         return self.model(header, trailer, children)
 
 
 class BaseSingleParser(BaseParser):
     fields_config = {}
+    event_type = None
 
     def can_parse(self):
-        try:
-            self._check_record_code(self.model.code)
-        except ParsingException:
-            return False
-        return True
-
-    def _parse_field_from_config(self, field_config, raw_value):
-        if isinstance(field_config, str):
-            field_config = (field_config, lambda x: x)
-
-        field_name, parser = field_config
+        return self._iter.current_record.code == self.model.code
 
-        # Integer check
-        if parser is int and 'total' in field_name:
-            field_value = parser(raw_value) if raw_value else 0
-        else:
-            field_value = parser(raw_value) if raw_value else None
-        return field_name, field_value
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
 
-    def _parse_fields_from_config(self, values, fields_config):
-        fields = {}
-
-        for index, field_config in enumerate(fields_config):
-            field_name, field_value = self._parse_field_from_config(
-                field_config, values[index],
-            )
-            fields[field_name] = field_value
-        return fields
+        # compiles each `<name>fields_config` of the class into a `decode_<name>fields` function
+        for name in dir(cls):
+            if name.endswith('fields_config'):
+                decoder = compile_fields_decoder(getattr(cls, name))
+                setattr(cls, 'decode_' + name[:-len('_config')], staticmethod(decoder))
 
     def _parse_fields(self, record):
-        return self._parse_fields_from_config(
-            record.fields,
-            self.fields_config,
-        )
+        return self.decode_fields(record.fields)
 
     @classmethod
-    def _parse_availability(cls, funds_type, rest):
+    def _parse_availability(cls, funds_type, values, index):
+        """
+        Parses the availability fields starting at values[index] and
+        returns a tuple (availability, index of the next field).
+        """
         availability = None
         if funds_type == FundsType.distributed_availability_simple:
             availability = OrderedDict()
             for day in ['0', '1', '>1']:
-                availability[day] = int(rest.pop(0))
+                availability[day] = int(values[index])
+                index += 1
         elif funds_type == FundsType.value_dated:
-            date = rest.pop(0)
-            time = rest.pop(0)
+            date = values[index]
+            time = values[index + 1]
+            index += 2
             availability = OrderedDict()
             availability['date'] = parse_date(date) if date else None
             availability['time'] = parse_time(time) if time else None
         elif funds_type == FundsType.distributed_availability:
-            num_distributions = int(rest.pop(0))
+            num_distributions = int(values[index])
+            index += 1
             availability = OrderedDict()
             for _ in range(num_distributions):
-                day = rest.pop(0)
-                amount = int(rest.pop(0))
+                day = values[index]
+                amount = int(values[index + 1])
+                index += 2
                 availability[day] = amount
 
-        return availability, rest
+        return availability, index
 
-    def parse(self):
-        self._check_record_code(self.model.code)
-        obj = self.model(
-            self._iter.current_record.rows,
-            **self._parse_fields(self._iter.current_record),
-        )
+    def parse_record(self, record):
+        obj = self.model(record.rows, **self._parse_fields(record))
+        if not self.retain_rows:
+            obj.discard_rows()
+        elif self.track_changes:
+            obj.track_changes()
 
         self.validate(obj)
 
+        return obj
+
+    def parse(self):
+        self._check_record_code(self.model.code)
+        obj = self.parse_record(self._iter.current_record)
+
         try:
             self._iter.advance()
         except StopIteration:
@@ -204,12 +303,18 @@ class BaseSingleParser(BaseParser):
 
         return obj
 
+    def iter_events(self):
+        obj = self.parse()
+        yield Event(self.event_type, obj)
+        return obj.number_of_rows, obj
+
 
 # IMPLEMENTATION
 
 
 class TransactionDetailParser(BaseSingleParser):
     model = TransactionDetail
+    event_type = EventType.transaction
 
     head_fields_config = [
         ('type_code', parse_type_code),
@@ -224,28 +329,22 @@ class TransactionDetailParser(BaseSingleParser):
     ]
 
     def _parse_fields(self, record):
+        values = record.fields
         # fields at the start
-        rest = record.fields
-        fields = self._parse_fields_from_config(
-            rest[:len(self.head_fields_config)],
-            self.head_fields_config,
-        )
+        fields = self.decode_head_fields(values)
 
-        rest = rest[len(self.head_fields_config):]
         # availability fields:
-        availability, rest = self._parse_availability(
+        availability, index = self._parse_availability(
             fields['funds_type'],
-            rest,
+            values,
+            len(self.head_fields_config),
         )
         fields['availability'] = availability
 
-        # fields at the end
-        fields.update(
-            self._parse_fields_from_config(
-                rest[:2] + [','.join(rest[2:])],
-                self.tail_fields_config,
-            ),
-        )
+        # fields at the end, the text might contain commas
+        tail = values[index:index + 2]
+        tail.append(','.join(values[index + 2:]))
+        fields.update(self.decode_tail_fields(tail))
 
         return fields
 
@@ -265,22 +364,24 @@ class AccountIdentifierParser(BaseSingleParser):
     ]
 
     def _parse_fields(self, record):
-        model_fields = self._parse_fields_from_config(
-            record.fields[:len(self.common_fields_config)],
-            self.common_fields_config,
-        )
+        values = record.fields
+        model_fields = self.decode_common_fields(values)
 
         summary_items = []
-        rest = record.fields[len(self.common_fields_config):]
-        while rest:
+        index = len(self.common_fields_config)
+        last_index = len(values) - 1
+        while index <= last_index:
             # there's currently a bug in some exports so we need to ignore
             # the last empty item if it's the only one left.
-            if len(rest) == 1 and not rest[0]:
+            if index == last_index and not values[index]:
                 break
 
-            summary = self._parse_fields_from_config(rest, self.summary_fields_config)
-            rest = rest[len(self.summary_fields_config):]
-            availability, rest = self._parse_availability(summary['funds_type'], rest)
+            summary = self.decode_summary_fields(values, index)
+            availability, index = self._parse_availability(
+                summary['funds_type'],
+                values,
+                index + len(self.summary_fields_config),
+            )
             if availability:
                 summary['availability'] = availability
             summary_items.append(Summary(**summary))
@@ -303,21 +404,23 @@ class AccountParser(BaseSectionParser):
     header_parser_class = AccountIdentifierParser
     trailer_parser_class = AccountTrailerParser
     child_parser_class = TransactionDetailParser
+    start_event_type = EventType.account_start
+    end_event_type = EventType.account_end
 
-    def validate(self, obj):
-        super().validate(obj)
+    def get_header_control_total(self, header):
+        return sum(summary.amount or 0 for summary in header.summary_items)
 
-        if self.check_integrity:
-            transaction_sum = sum(child.amount or 0 for child in obj.children)
-            account_sum = sum(
-                summary.amount or 0 for summary in obj.header.summary_items
-            )
+    def get_child_control_total(self, child):
+        return child.amount or 0
 
-            control_total = transaction_sum + account_sum
-            if control_total != obj.trailer.account_control_total:
+    def validate_totals(self, header, trailer, totals):
+        super().validate_totals(header, trailer, totals)
+
+        if self.check_integrity:
+            if totals.control_total != trailer.account_control_total:
                 raise IntegrityException(
-                    f'Invalid account control total for {obj.__class__.__name__}. '
-                    f'expected {obj.trailer.account_control_total}, found {control_total}',
+                    f'Invalid account control total for {self.model.__name__}. '
+                    f'expected {trailer.account_control_total}, found {totals.control_total}',
                 )
 
 
@@ -359,28 +462,29 @@ class GroupParser(BaseSectionParser):
     header_parser_class = GroupHeaderParser
     trailer_parser_class = GroupTrailerParser
     child_parser_class = AccountParser
+    start_event_type = EventType.group_start
+    end_event_type = EventType.group_end
 
-    def validate(self, obj):
-        super().validate(obj)
+    def get_child_control_total(self, child):
+        return child.trailer.account_control_total
+
+    def validate_totals(self, header, trailer, totals):
+        super().validate_totals(header, trailer, totals)
 
-        if not obj.children:
+        if not totals.number_of_children:
             raise ParsingException('Group without accounts not allowed')
 
         if self.check_integrity:
-            if obj.trailer.number_of_accounts != len(obj.children):
+            if trailer.number_of_accounts != totals.number_of_children:
                 raise IntegrityException(
-                    f'Invalid number of accounts for {obj.__class__.__name__}. '
-                    f'expected {obj.trailer.number_of_accounts}, found {len(obj.children)}',
+                    f'Invalid number of accounts for {self.model.__name__}. '
+                    f'expected {trailer.number_of_accounts}, found {totals.number_of_children}',
                 )
 
-            control_total = sum(
-                account.trailer.account_control_total for account in obj.children
-            )
-
-            if control_total != obj.trailer.group_control_total:
+            if totals.control_total != trailer.group_control_total:
                 raise IntegrityException(
-                    f'Invalid group control total for {obj.__class__.__name__}. '
-                    f'expected {obj.trailer.group_control_total}, found {control_total}',
+                    f'Invalid group control total for {self.model.__name__}. '
+                    f'expected {trailer.group_control_total}, found {totals.control_total}',
                 )
 
 
@@ -420,26 +524,510 @@ class Bai2FileParser(BaseSectionParser):
     header_parser_class = Bai2FileHeaderParser
     trailer_parser_class = Bai2FileTrailerParser
     child_parser_class = GroupParser
+    start_event_type = EventType.file_header
+    end_event_type = EventType.file_end
 
-    def validate(self, obj):
-        super().validate(obj)
+    def get_child_control_total(self, child):
+        return child.trailer.group_control_total
+
+    def validate_totals(self, header, trailer, totals):
+        super().validate_totals(header, trailer, totals)
 
-        if not obj.children:
+        if not totals.number_of_children:
             raise ParsingException('File without groups not allowed')
 
         if self.check_integrity:
-            if obj.trailer.number_of_groups != len(obj.children):
+            if trailer.number_of_groups != totals.number_of_children:
                 raise IntegrityException(
-                    f'Invalid number of groups for {obj.__class__.__name__}. '
-                    f'expected {obj.trailer.number_of_groups}, found {len(obj.children)}',
+                    f'Invalid number of groups for {self.model.__name__}. '
+                    f'expected {trailer.number_of_groups}, found {totals.number_of_children}',
                 )
 
-            control_total = sum(
-                account.trailer.group_control_total for account in obj.children
-            )
-
-            if control_total != obj.trailer.file_control_total:
+            if totals.control_total != trailer.file_control_total:
                 raise IntegrityException(
-                    f'Invalid file control total for {obj.__class__.__name__}. '
-                    f'expected {obj.trailer.file_control_total}, found {control_total}',
+                    f'Invalid file control total for {self.model.__name__}. '
+                    f'expected {trailer.file_control_total}, found {totals.control_total}',
                 )
+
+
+# STATE MACHINE
+
+EXPECT, OPEN_SECTION, ADD_CHILD, CLOSE_SECTION = range(4)
+
+
+class SectionFrame:
+    def __init__(self, parser, header, totals):
+        self.parser = parser
+        self.header = header
+        self.children = []
+        self.totals = totals
+
+
+class StateMachineParser:
+    """
+    Parses a file with a flat transition table keyed on record codes instead of
+    descending through the section parsers record by record.
+
+    The table is derived from the section parsers of parser_class so subclasses of
+    them are honoured; the same models are built and the same exceptions raised.
+    """
+
+    def __init__(
+        self, iterator, check_integrity=True, retain_rows=True, track_changes=False, parser_class=Bai2FileParser,
+    ):
+        """
+        Keyword arguments:
+        check_integrity -- checks the data integrity of the parsed file (default True)
+        retain_rows -- keeps the original rows in the parsed models (default True)
+        track_changes -- remembers the parsed fields so that unmodified records can be written as they were read
+                         (default False)
+        parser_class -- the section parser describing the file (default Bai2FileParser)
+        """
+        self._iter = iterator
+        self.check_integrity = check_integrity
+        self.retain_rows = retain_rows
+        self.track_changes = track_changes
+        self.root_parser = parser_class(
+            iterator, check_integrity=check_integrity, retain_rows=retain_rows, track_changes=track_changes,
+        )
+        self._table = self._build_table()
+
+    @classmethod
+    def _get_accepted_codes(cls, parser):
+        if isinstance(parser, BaseSectionParser):
+            codes = {parser.header_parser.model.code, parser.trailer_parser.model.code}
+            if parser.child_parser:
+                codes |= cls._get_accepted_codes(parser.child_parser)
+            return codes
+        return {parser.model.code}
+
+    def _get_body_transitions(self, section_parser):
+        transitions = {}
+        child_parser = section_parser.child_parser
+        if isinstance(child_parser, BaseSectionParser):
+            header_code = child_parser.header_parser.model.code
+            for code in self._get_accepted_codes(child_parser):
+                transitions[code] = (EXPECT, header_code)
+            transitions[header_code] = (OPEN_SECTION, child_parser)
+        elif child_parser:
+            transitions[child_parser.model.code] = (ADD_CHILD, child_parser)
+        trailer_code = section_parser.trailer_parser.model.code
+        transitions.setdefault(trailer_code, (CLOSE_SECTION, section_parser))
+        return transitions, trailer_code
+
+    def _build_table(self):
+        """
+        State 0 expects the file header, state n is the body of the section
+        opened at depth n, i.e. the state is the number of open sections.
+        """
+        header_code = self.root_parser.header_parser.model.code
+        table = [{
+            code: (OPEN_SECTION, self.root_parser) if code == header_code else (EXPECT, header_code)
+            for code in RecordCode
+        }]
+
+        section_parser = self.root_parser
+        while isinstance(section_parser, BaseSectionParser):
+            transitions, trailer_code = self._get_body_transitions(section_parser)
+            table.append({
+                code: transitions.get(code, (EXPECT, trailer_code))
+                for code in RecordCode
+            })
+            section_parser = section_parser.child_parser
+        return table
+
+    def _advance(self):
+        try:
+            self._iter.advance()
+        except StopIteration:
+            return False
+        return True
+
+    def _open_section(self, stack, parser, record):
+        header = parser.header_parser.parse_record(record)
+        stack.append(SectionFrame(parser, header, parser.get_header_totals(header)))
+        return Event(parser.start_event_type, header)
+
+    def _add_child(self, stack, parser, record, retain_children):
+        child = parser.parse_record(record)
+        self._append_child(stack[-1], child.number_of_rows, child, retain_children)
+        return Event(parser.event_type, child)
+
+    @staticmethod
+    def _append_child(frame, number_of_records, child, retain_children):
+        if retain_children:
+            frame.children.append(child)
+        else:
+            frame.parser.add_child_totals(frame.totals, number_of_records, child)
+
+    @staticmethod
+    def _close_section(frame, trailer, retain_children):
+        parser = frame.parser
+        if retain_children:
+            obj = parser.build_model(frame.header, frame.children, trailer)
+            parser.validate(obj)
+            return None, obj
+
+        frame.totals.number_of_records += trailer.number_of_rows
+        parser.validate_totals(frame.header, trailer, frame.totals)
+        return frame.totals.number_of_records, parser.build_model(frame.header, [], trailer)
+
+    def _run(self, retain_children):
+        stack = []
+        table = self._table
+        has_records = True
+        while True:
+            record = self._iter.current_record
+            action, target = table[len(stack)][record.code]
+            if action == EXPECT:
+                raise ParsingException(f'Expected {target}, got {record.code} instead')
+            if not has_records:
+                # the last record has already been consumed
+                raise ParsingException(f'Unexpected end of file after {record.code}')
+
+            if action == OPEN_SECTION:
+                event = self._open_section(stack, target, record)
+                has_records = self._advance()
+            elif action == ADD_CHILD:
+                event = self._add_child(stack, target, record, retain_children)
+                has_records = self._advance()
+            else:
+                trailer = target.trailer_parser.parse_record(record)
+                has_records = self._advance()
+                number_of_records, obj = self._close_section(stack.pop(), trailer, retain_children)
+                event = Event(target.end_event_type, trailer)
+                if not stack:
+                    yield event
+                    return obj
+                self._append_child(stack[-1], number_of_records, obj, retain_children)
+            yield event
+
+    def parse(self):
+        events = self._run(retain_children=True)
+        try:
+            while True:
+                next(events)
+        except StopIteration as stop:
+            return stop.value
+
+    def iter_events(self):
+        """
+        Generates the events of the file without retaining parsed children,
+        integrity is checked against running totals as each trailer is read.
+        """
+        return self._run(retain_children=False)
+
+
+# PARALLEL
+
+
+def parse_lines(parser_class, lines, options):
+    # runs in an executor's worker, what's parsed is sent back as a copy when it's another process
+    if issubclass(parser_class, BaseSectionParser):
+        return StateMachineParser(IteratorHelper(lines), parser_class=parser_class, **options).parse()
+
+    parser = parser_class(None, **options)
+    return [parser.parse_record(record) for record in record_generator(lines)]
+
+
+class SectionSpan:
+    """
+    Positions of the lines of a section, its header and trailer, and its children:
+    spans of sections or the first line of each record.
+    """
+
+    def __init__(self, parser, start):
+        self.parser = parser
+        self.start = start
+        self.header_end = None
+        self.children = []
+        self.trailer_start = None
+        self.end = None
+        # (parser class, start, end) of the lines parsed by workers, None when the children are built from spans
+        self.parts = None
+
+    @property
+    def has_child_sections(self):
+        return isinstance(self.parser.child_parser, BaseSectionParser)
+
+
+class ParallelParser:
+    """
+    Parses a file in the workers of a concurrent.futures executor, a group per worker
+    or, given records_per_chunk, the transactions of each account in chunks of that many records.
+    Workers use a StateMachineParser rooted at the group parser, or the transaction parser,
+    and the sections around them are parsed and validated once they are put back in order.
+
+    The lines are scanned for the positions of the sections first,
+    files not laid out as the section parsers describe are parsed sequentially for the same errors.
+    """
+
+    def __init__(
+        self, lines, executor, chunksize=1, records_per_chunk=None, check_integrity=True, retain_rows=True,
+        track_changes=False, parser_class=Bai2FileParser,
+    ):
+        """
+        Keyword arguments:
+        chunksize -- number of parts sent to each process of a ProcessPoolExecutor at a time (default 1)
+        records_per_chunk -- number of transactions decoded by each part instead of whole groups (default None)
+        check_integrity -- checks the data integrity of the parsed file (default True)
+        retain_rows -- keeps the original rows in the parsed models (default True)
+        track_changes -- remembers the parsed fields so that unmodified records can be written as they were read
+                         (default False)
+        parser_class -- the section parser describing the file (default Bai2FileParser)
+        """
+        self._lines = lines
+        self.executor = executor
+        self.chunksize = chunksize
+        self.records_per_chunk = records_per_chunk
+        self.parser_class = parser_class
+        self.options = {
+            'check_integrity': check_integrity,
+            'retain_rows': retain_rows,
+            'track_changes': track_changes,
+        }
+        self.root_parser = parser_class(None, **self.options)
+
+    @staticmethod
+    def _get_code(parser):
+        if isinstance(parser, BaseSectionParser):
+            parser = parser.header_parser
+        return parser.model.code.value
+
+    def _scan_line(self, stack, index, code):
+        """
+        Adds the line starting a record to the spans, returns the span and the position set
+        where the next record starts, () if there's none or None if the record isn't expected there.
+        """
+        span = stack[-1]
+        child_parser = span.parser.child_parser
+        if child_parser is not None and code == self._get_code(child_parser):
+            if span.has_child_sections:
+                child = SectionSpan(child_parser, index)
+                span.children.append(child)
+                stack.append(child)
+                return child, 'header_end'
+            span.children.append(index)
+            return ()
+        if code == span.parser.trailer_parser.model.code.value:
+            span.trailer_start = index
+            stack.pop()
+            return span, 'end'
+        return None
+
+    def _scan(self, lines):
+        """
+        Returns the span of the file or None if the lines aren't laid out as the section parsers describe.
+        """
+        root = None
+        stack = []
+        # headers and trailers end where the next record starts, after their continuations
+        ending = ()
+        for index, line in enumerate(lines):
+            code = line[:2]
+            if code == CONTINUATION_CODE and index:
+                continue
+            if ending:
+                setattr(*ending, index)
+
+            if stack:
+                ending = self._scan_line(stack, index, code)
+            elif root is None and code == self._get_code(self.root_parser):
+                root = SectionSpan(self.root_parser, index)
+                stack.append(root)
+                ending = root, 'header_end'
+            else:
+                ending = None
+            if ending is None:
+                return None
+
+        if root is None or stack:
+            return None
+        if ending:
+            setattr(*ending, len(lines))
+        return root
+
+    def _split_parts(self, span):
+        """
+        Yields the parts of the file parsed by workers in the order they're put back in.
+        """
+        child_parser_class = type(span.parser.child_parser)
+        if not span.has_child_sections:
+            records_per_chunk = self.records_per_chunk or len(span.children) or 1
+            starts = span.children[::records_per_chunk]
+            span.parts = list(zip(itertools.repeat(child_parser_class), starts, starts[1:] + [span.trailer_start]))
+        elif self.records_per_chunk is None:
+            span.parts = [(child_parser_class, child.start, child.end) for child in span.children]
+        else:
+            for child in span.children:
+                yield from self._split_parts(child)
+            return
+        yield from span.parts
+
+    def _parse_single(self, single_parser, lines):
+        return single_parser.parse_record(next(record_generator(lines)))
+
+    def _build_model(self, span, lines, parsed_parts):
+        parser = span.parser
+        header = self._parse_single(parser.header_parser, lines[span.start:span.header_end])
+        if span.parts is None:
+            children = [self._build_model(child, lines, parsed_parts) for child in span.children]
+        elif span.has_child_sections:
+            children = list(itertools.islice(parsed_parts, len(span.parts)))
+        else:
+            children = list(itertools.chain.from_iterable(itertools.islice(parsed_parts, len(span.parts))))
+        trailer = self._parse_single(parser.trailer_parser, lines[span.trailer_start:span.end])
+
+        obj = parser.build_model(header, children, trailer)
+        parser.validate(obj)
+        return obj
+
+    def parse(self):
+        lines = list(split_fixed_length_lines(self._lines))
+        root = self._scan(lines)
+        if root is None:
+            return StateMachineParser(IteratorHelper(lines), parser_class=self.parser_class, **self.options).parse()
+
+        parts = list(self._split_parts(root))
+        parsed_parts = self.executor.map(
+            parse_lines,
+            [parser_class for parser_class, start, end in parts],
+            [lines[start:end] for parser_class, start, end in parts],
+            itertools.repeat(self.options),
+            chunksize=self.chunksize,
+        )
+        return self._build_model(root, lines, parsed_parts)
+
+
+# ASYNC
+
+
+class AsyncParser:
+    """
+    Parses lines read from an async iterator with a StateMachineParser, reading ahead only
+    the lines its next step needs and giving control back to the event loop every events_per_yield events.
+    """
+
+    def __init__(self, lines, events_per_yield=1000, **kwargs):
+        """
+        Keyword arguments:
+        events_per_yield -- number of events parsed between each time control is given back (default 1000)
+
+        Other keyword arguments are given to the StateMachineParser.
+        """
+        self._queue = LineQueue(lines)
+        self.events_per_yield = events_per_yield
+        self.options = kwargs
+        self._number_of_events = 0
+
+    async def _start(self, retain_children):
+        await self._queue.fill()
+        return StateMachineParser(IteratorHelper(self._queue), **self.options)._run(retain_children)
+
+    async def _before_step(self):
+        if self._queue.needs_filling:
+            await self._queue.fill()
+        self._number_of_events += 1
+        if self._number_of_events % self.events_per_yield == 0:
+            await asyncio.sleep(0)
+
+    async def parse(self):
+        events = await self._start(retain_children=True)
+        while True:
+            await self._before_step()
+            try:
+                next(events)
+            except StopIteration as stop:
+                return stop.value
+
+    async def iter_events(self):
+        """
+        Generates the events of the file without retaining parsed children,
+        integrity is checked against running totals as each trailer is read.
+        """
+        events = await self._start(retain_children=False)
+        while True:
+            await self._before_step()
+            try:
+                event = next(events)
+            except StopIteration:
+                return
+            yield event
+
+
+# PIPELINE
+
+
+class PipelinedParser:
+    """
+    Generates the events of a file with reading lines and assembling records, parsing records into events
+    and delivering the events as three stages: the first two in their own threads and the last in the thread
+    iterating the events, so that parsing carries on while it does I/O.
+    Stages pass batches through bounded StageQueues, records then events, whose metrics are kept in queues.
+
+    Errors are raised where parsing would raise them, after the events before them.
+    """
+
+    def __init__(self, lines, queue_size=64, batch_size=256, **kwargs):
+        """
+        Keyword arguments:
+        queue_size -- number of batches a queue holds before the stage filling it waits (default 64)
+        batch_size -- number of records or events passed between stages at a time (default 256)
+
+        Other keyword arguments are given to the StateMachineParser.
+        """
+        self._lines = lines
+        self.batch_size = batch_size
+        self.options = kwargs
+        self.records = StageQueue('records', queue_size)
+        self.events = StageQueue('events', queue_size)
+        self.queues = (self.records, self.events)
+        self._stopped = threading.Event()
+
+    def _feed(self, stage_queue, items):
+        """
+        Puts the items in the queue a batch at a time, then the exception raised producing them or None at the end.
+        """
+        batch = []
+        end = None
+        try:
+            for item in items:
+                batch.append(item)
+                if len(batch) == self.batch_size:
+                    if not stage_queue.put(batch, self._stopped):
+                        return
+                    batch = []
+        except Exception as e:
+            end = e
+
+        if batch and not stage_queue.put(batch, self._stopped):
+            return
+        stage_queue.put(end, self._stopped)
+
+    def _iter_queue(self, stage_queue):
+        while True:
+            item = stage_queue.get(self._stopped)
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield from item
+
+    def _parse_records(self):
+        helper = IteratorHelper(self._iter_queue(self.records), generator=iter)
+        yield from StateMachineParser(helper, **self.options)._run(retain_children=False)
+
+    def iter_events(self):
+        stages = [
+            threading.Thread(target=self._feed, args=(self.records, record_generator(self._lines)), daemon=True),
+            threading.Thread(target=self._feed, args=(self.events, self._parse_records()), daemon=True),
+        ]
+        for stage in stages:
+            stage.start()
+        try:
+            yield from self._iter_queue(self.events)
+        finally:
+            # stages still running when the events stop being read are stopped
+            self._stopped.set()
+            for stage in stages:
+                stage.join()
@@ -1,6 +1,12 @@
-from collections import OrderedDict
+import bz2
+import io
+import itertools
+import lzma
+import zlib
 
 from .constants import CONTINUATION_CODE
+from .dates import write_date, write_time
+from .exceptions import WritingException
 from .models import (
     Account,
     AccountIdentifier,
@@ -13,25 +19,181 @@ from .models import (
     GroupTrailer,
     TransactionDetail,
 )
-from .utils import convert_to_string, write_date, write_time
+from .parsers import SectionTotals
+from .utils import convert_to_string
+
+
+# incremental compressors by name, wbits=31 writes a gzip header and trailer around the deflate stream
+COMPRESSORS = {
+    'gzip': lambda: zlib.compressobj(wbits=31),
+    'bz2': bz2.BZ2Compressor,
+    'lzma': lzma.LZMACompressor,
+}
+
+
+class LineEncoder:
+    """
+    Joins lines with line_terminator, lines_per_chunk lines at a time,
+    and encodes them with the given encoding, compressed with gzip, bz2 or lzma if compression is given.
+    """
+
+    def __init__(self, encoding='utf-8', line_terminator='\n', compression=None, lines_per_chunk=256):
+        if compression is not None and compression not in COMPRESSORS:
+            raise WritingException(f'Unknown compression {compression}, expected one of {", ".join(COMPRESSORS)}')
+        self.encoding = encoding
+        self.line_terminator = line_terminator
+        self.compression = compression
+        self.lines_per_chunk = lines_per_chunk
+        self.number_of_lines = 0
+
+    def iter_chunks(self, lines):
+        lines = iter(lines)
+        for batch in iter(lambda: list(itertools.islice(lines, self.lines_per_chunk)), []):
+            chunk = self.line_terminator.join(batch)
+            if self.number_of_lines:
+                chunk = self.line_terminator + chunk
+            self.number_of_lines += len(batch)
+            yield chunk
+
+    def iter_bytes(self, lines):
+        if self.compression is None:
+            for chunk in self.iter_chunks(lines):
+                yield chunk.encode(self.encoding)
+            return
+
+        compressor = COMPRESSORS[self.compression]()
+        for chunk in self.iter_chunks(lines):
+            data = compressor.compress(chunk.encode(self.encoding))
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class LineSink(LineEncoder):
+    """
+    Writes lines separated by line_terminator to a text or binary file object,
+    binary file objects get the lines encoded with the given encoding and compressed if compression is given.
+    """
+
+    def __init__(self, fileobj, encoding='utf-8', line_terminator='\n', compression=None, lines_per_chunk=256):
+        super().__init__(
+            encoding=encoding, line_terminator=line_terminator, compression=compression,
+            lines_per_chunk=lines_per_chunk,
+        )
+        self.fileobj = fileobj
+        self.binary = isinstance(fileobj, (io.RawIOBase, io.BufferedIOBase)) or 'b' in getattr(fileobj, 'mode', '')
+        if compression is not None and not self.binary:
+            raise WritingException('Compressed output needs a binary file object')
+
+    def write(self, lines):
+        chunks = self.iter_bytes(lines) if self.binary else self.iter_chunks(lines)
+        for chunk in chunks:
+            self.fileobj.write(chunk)
+
+
+class BlockSink:
+    """
+    Writes lines as fixed length records padded with spaces, block_size records at a time,
+    to a binary file object or a writable buffer such as a preallocated bytearray.
+    """
+
+    def __init__(self, target, record_length, block_size=None, encoding='utf-8', block_separator=b''):
+        self.target = target
+        self.record_length = record_length
+        self.block_size = block_size or 1
+        self.encoding = encoding
+        self.block_separator = block_separator
+        self.number_of_bytes = 0
+
+    def _write_bytes(self, data):
+        if hasattr(self.target, 'write'):
+            self.target.write(data)
+        else:
+            end = self.number_of_bytes + len(data)
+            with memoryview(self.target) as view:
+                if end > len(view):
+                    raise WritingException(f'Buffer of {len(view)} bytes too small')
+                view[self.number_of_bytes:end] = data
+        self.number_of_bytes += len(data)
+
+    def _write_block(self, block):
+        if self.number_of_bytes and self.block_separator:
+            self._write_bytes(self.block_separator)
+        self._write_bytes(b''.join(block))
+
+    def write(self, lines):
+        block = []
+        for line in lines:
+            record = line.encode(self.encoding)
+            if len(record) > self.record_length:
+                raise WritingException(f'Record longer than {self.record_length} characters: {line}')
+            block.append(record.ljust(self.record_length))
+            if len(block) == self.block_size:
+                self._write_block(block)
+                block = []
+        if block:
+            self._write_block(block)
 
 
 class BaseWriter:
-    def __init__(self, obj, line_length=80, text_on_new_line=False, clock_format_for_intra_day=False):
+    def __init__(
+        self, obj, line_length=80, text_on_new_line=False, clock_format_for_intra_day=False, passthrough=False,
+        executor=None, chunksize=1, trust_totals=False,
+    ):
         """
         Keyword arguments:
         line_length -- number of characters per record (default 80)
         text_on_new_line -- whether to begin a text field in a new record (default False)
         clock_format_for_intra_day -- use HH:MM:SS instead of HHMM for intra-day times (default False)
+        passthrough -- copy the original rows of records parsed with track_changes and not modified since
+                       (default False)
+        executor -- a concurrent.futures executor writing the accounts in parallel (default None)
+        chunksize -- number of accounts sent to each process of a ProcessPoolExecutor at a time (default 1)
+        trust_totals -- only add up the totals of sections whose number of children changed since the add and
+                        remove methods last updated them, instead of every section (default False)
         """
         self.obj = obj
         self.line_length = line_length
         self.text_on_new_line = text_on_new_line
         self.clock_format_for_intra_day = clock_format_for_intra_day
+        self.passthrough = passthrough
+        self.executor = executor
+        self.chunksize = chunksize
+        self.trust_totals = trust_totals
+
+    def get_options(self):
+        return {
+            'line_length': self.line_length,
+            'text_on_new_line': self.text_on_new_line,
+            'clock_format_for_intra_day': self.clock_format_for_intra_day,
+            'passthrough': self.passthrough,
+            'trust_totals': self.trust_totals,
+        }
 
     def write(self):
         raise NotImplementedError()
 
+    def iter_lines(self):
+        return iter(self.write())
+
+    def write_to(self, fileobj, encoding='utf-8', line_terminator='\n', compression=None):
+        """
+        Writes the lines to a text or binary file object as they are produced,
+        binary file objects get the lines encoded with the given encoding
+        and compressed with gzip, bz2 or lzma if compression is given.
+        Returns the number of lines written.
+        """
+        sink = LineSink(fileobj, encoding=encoding, line_terminator=line_terminator, compression=compression)
+        sink.write(self.iter_lines())
+        return sink.number_of_lines
+
+    def iter_bytes(self, encoding='utf-8', line_terminator='\n', compression=None):
+        """
+        Yields the lines encoded, and compressed if compression is given, a chunk at a time.
+        """
+        encoder = LineEncoder(encoding=encoding, line_terminator=line_terminator, compression=compression)
+        return encoder.iter_bytes(self.iter_lines())
+
 
 class BaseSectionWriter(BaseWriter):
     model = None
@@ -40,71 +202,158 @@ class BaseSectionWriter(BaseWriter):
     trailer_writer_class = None
 
     def write(self):
-        header = self.header_writer_class(self.obj.header).write()
-
-        children = []
-        for child in self.obj.children:
-            children += self.child_writer_class(child).write()
+        return list(self.iter_lines())
 
-        self.obj.update_totals()
-        self.obj.trailer.number_of_records = len(header) + len(children) + 1
-        trailer = self.trailer_writer_class(self.obj.trailer).write()
+    def _get_writer(self, writer_class, obj):
+        return writer_class(obj, **self.get_options())
 
-        return header + children + trailer
+    def _get_written_accounts(self):
+        """
+        Returns an iterator over the lines of the accounts of the section written by the executor,
+        None if they are written one after another.
+        """
+        if self.executor is None:
+            return None
+
+        accounts = list(iter_accounts(self.obj))
+        for account in accounts:
+            # brings the totals of the parent sections up to date as if written here
+            self._update_totals(account)
+        return self.executor.map(
+            write_account, accounts, itertools.repeat(self.get_options()), chunksize=self.chunksize,
+        )
+
+    def _update_totals(self, section):
+        if self.trust_totals:
+            section.ensure_totals()
+        else:
+            section.update_totals()
 
+    def iter_lines(self):
+        return self._iter_lines(self._get_written_accounts())
 
-class BaseSingleWriter(BaseWriter):
-    model = None
+    def _iter_lines(self, written_accounts):
+        header = self._get_writer(self.header_writer_class, self.obj.header).write()
+        yield from header
 
-    def _write_field_from_config(self, field_config):
+        number_of_records = len(header)
+        for child in self.obj.children:
+            child_writer = self._get_writer(self.child_writer_class, child)
+            if isinstance(child_writer, BaseSectionWriter):
+                lines = child_writer._iter_lines(written_accounts)
+            else:
+                lines = child_writer.iter_lines()
+            for line in lines:
+                number_of_records += 1
+                yield line
+
+        self._update_totals(self.obj)
+        self.obj.trailer.number_of_records = number_of_records + 1
+        yield from self._get_writer(self.trailer_writer_class, self.obj.trailer).write()
+
+
+def expands_fields(func):
+    """
+    Marks a fields_config function as returning a list of fields instead of a single value.
+    """
+    func.expands_fields = True
+    return func
+
+
+def _expand_written_value(value):
+    if isinstance(value, dict):
+        return value.values()
+    return ('' if value is None else str(value),)
+
+
+def compile_fields_encoder(fields_config):
+    """
+    Generates a function turning the fields of a model into a list of strings.
+
+    Each item of fields_config is either a field name, whose value is written as is,
+    or a tuple (field name, function) where the function is called with the writer
+    and the value unless it's None; None values are written as blank fields.
+    Functions marked with expands_fields return a list of fields, other functions returning
+    a dict have each of its values written as a field.
+    """
+    namespace = {'_expand_written_value': _expand_written_value}
+    statements = []
+    items = []
+    # functions returning a dict have each of its values written as a field, as fields used to be written
+    expanding_items = []
+    dict_checks = []
+    for index, field_config in enumerate(fields_config):
         if isinstance(field_config, str):
-            field_config = (field_config, lambda w, x: x)
+            field_config = (field_config, None)
 
         field_name, write_func = field_config
-        field_value = getattr(self.obj, field_name, None)
-        output = write_func(self, field_value) if field_value is not None else None
-
-        if isinstance(output, dict):
-            return output
+        value = f'value_{index}'
+        func_name = f'func_{index}'
+        namespace[func_name] = write_func
+        statements.append(f'{value} = getattr(obj, {field_name!r}, None)')
+        if write_func is None:
+            item = expanding_item = f"'' if {value} is None else str({value})"
+        elif getattr(write_func, 'expands_fields', False):
+            statements.append(f"{value} = ('',) if {value} is None else {func_name}(writer, {value})")
+            item = expanding_item = f'*{value}'
         else:
-            return {field_name: convert_to_string(output)}
+            statements.append(f'{value} = None if {value} is None else {func_name}(writer, {value})')
+            item = f"'' if {value} is None else str({value})"
+            expanding_item = f'*_expand_written_value({value})'
+            dict_checks.append(f'isinstance({value}, dict)')
+        items.append(item)
+        expanding_items.append(expanding_item)
+
+    if dict_checks:
+        statements.append(f"if {' or '.join(dict_checks)}:")
+        statements.append('    return [' + ', '.join(expanding_items) + ']')
+    statements.append('return [' + ', '.join(items) + ']')
+    source = 'def encode(writer, obj):\n' + ''.join(f'    {statement}\n' for statement in statements)
+    exec(source, namespace)
+    return namespace['encode']
 
-    def _write_fields_from_config(self, fields_config):
-        fields = OrderedDict()
-        for field_config in fields_config:
-            fields.update(self._write_field_from_config(field_config))
-        return fields
 
-    def write(self):
-        record = ''
-        fields = self._write_fields_from_config(self.fields_config)
+class BaseSingleWriter(BaseWriter):
+    model = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
 
-        record += self.model.code.value
-        for field_name in fields:
-            record += ',' + fields[field_name]
-        record += '/'
+        # compiles each `<name>fields_config` of the class into an `encode_<name>fields` function
+        for name in dir(cls):
+            if name.endswith('fields_config'):
+                encoder = compile_fields_encoder(getattr(cls, name))
+                setattr(cls, 'encode_' + name[:-len('_config')], staticmethod(encoder))
 
-        return [record]
+    def write(self):
+        if self.passthrough and self.obj.rows and not self.obj.modified:
+            return self.obj.as_lines()
+        return self.encode()
+
+    def encode(self):
+        return [','.join([self.model.code.value, *self.encode_fields(self, self.obj)]) + '/']
 
 
+@expands_fields
 def expand_availability(writer, availability):
-    fields = OrderedDict()
     if len(availability) == 0:
-        pass
+        return []
     elif list(availability.keys()) in [['0', '1', '>1'], ['date', 'time']]:
+        fields = []
         for field, value in availability.items():
             if field == 'date':
                 value = write_date(value) if value else None
             elif field == 'time':
                 value = (write_time(value, writer.clock_format_for_intra_day)
                          if value else None)
-            fields[field] = convert_to_string(value)
+            fields.append(convert_to_string(value))
+        return fields
     else:
-        fields['distribution_length'] = str(len(availability))
+        fields = [str(len(availability))]
         for field, value in availability.items():
-            fields[f'day_{field}'] = convert_to_string(field)
-            fields[f'amount_{field}'] = convert_to_string(value)
-    return fields
+            fields.append(convert_to_string(field))
+            fields.append(convert_to_string(value))
+        return fields
 
 
 class TransactionDetailWriter(BaseSingleWriter):
@@ -120,56 +369,38 @@ class TransactionDetailWriter(BaseSingleWriter):
         'text',
     ]
 
-    def write(self):
-        records = ['']
-        fields = self._write_fields_from_config(self.fields_config)
-
-        i = 0
-        records[i] += self.model.code.value
-        for field_name in fields:
-            if field_name == 'text' and self.obj.text:
-                text_cursor = 0
-                if self.text_on_new_line:
-                    records[i] += '/'
-                    records.append(CONTINUATION_CODE)
-                    i += 1
-
-                while text_cursor < len(self.obj.text):
-                    # -1 for comma after preceding field
-                    remaining_line_length = (self.line_length - len(records[i])) - 1
-
-                    if remaining_line_length > 0:
-                        end_index = text_cursor + remaining_line_length
-                        records[i] += ',' + self.obj.text[text_cursor:end_index]
-                        text_cursor = end_index
-                    else:
-                        records.append(CONTINUATION_CODE)
-                        i += 1
+    def encode(self):
+        fields = self.encode_fields(self, self.obj)
+        text = self.obj.text
+        if not text:
+            return [','.join([self.model.code.value, *fields])]
+
+        # text is always the last field and wraps onto continuation records
+        records = [','.join([self.model.code.value, *fields[:-1]])]
+        if self.text_on_new_line:
+            records[-1] += '/'
+            records.append(CONTINUATION_CODE)
+
+        text_cursor = 0
+        while text_cursor < len(text):
+            # -1 for comma after preceding field
+            remaining_line_length = (self.line_length - len(records[-1])) - 1
+
+            if remaining_line_length > 0:
+                end_index = text_cursor + remaining_line_length
+                records[-1] += ',' + text[text_cursor:end_index]
+                text_cursor = end_index
             else:
-                records[i] += ',' + fields[field_name]
+                records.append(CONTINUATION_CODE)
 
         return records
 
 
+@expands_fields
 def expand_summary_items(writer, summary_items):
-    items = OrderedDict()
-
-    for n, summary_item in enumerate(summary_items):
-        for summary_field_config in AccountIdentifierWriter.summary_fields_config:
-            if isinstance(summary_field_config, str):
-                summary_field_config = (summary_field_config, lambda w, x: x)
-
-            summary_field_name, write_func = summary_field_config
-            field_value = getattr(summary_item, summary_field_name, None)
-            output = (write_func(writer, field_value)
-                      if field_value is not None else None)
-
-            if isinstance(output, dict):
-                items.update(OrderedDict(
-                    [(f'{k}_{n}', v) for k, v in output.items()],
-                ))
-            else:
-                items[f'{summary_field_name}_{n}'] = convert_to_string(output)
+    items = []
+    for summary_item in summary_items:
+        items += writer.encode_summary_fields(writer, summary_item)
     return items
 
 
@@ -190,20 +421,19 @@ class AccountIdentifierWriter(BaseSingleWriter):
         ('availability', expand_availability),
     ]
 
-    def write(self):
-        records = ['']
-        fields = self._write_fields_from_config(self.fields_config)
-
-        i = 0
-        records[i] += self.model.code.value
-        for field_name in fields:
-            field_length = len(fields[field_name]) + 2
-            if (len(records[i]) + field_length) >= self.line_length:
-                records[i] += '/'
-                records.append(CONTINUATION_CODE)
-                i += 1
-            records[i] += ',' + fields[field_name]
-        records[i] += '/'
+    def encode(self):
+        records = []
+        record = [self.model.code.value]
+        record_length = len(record[0])
+        for field in self.encode_fields(self, self.obj):
+            field_length = len(field) + 2
+            if (record_length + field_length) >= self.line_length:
+                records.append(''.join(record) + '/')
+                record = [CONTINUATION_CODE]
+                record_length = len(CONTINUATION_CODE)
+            record.append(',' + field)
+            record_length += field_length - 1
+        records.append(''.join(record) + '/')
         return records
 
 
@@ -222,6 +452,31 @@ class AccountWriter(BaseSectionWriter):
     trailer_writer_class = AccountTrailerWriter
     child_writer_class = TransactionDetailWriter
 
+    def _get_written_accounts(self):
+        # a single account is written here, there's nothing to share with an executor
+        return None
+
+    def _iter_lines(self, written_accounts):
+        if written_accounts is None:
+            return super()._iter_lines(None)
+
+        lines = next(written_accounts)
+        self.obj.trailer.number_of_records = len(lines)
+        return iter(lines)
+
+
+def iter_accounts(section):
+    if isinstance(section, Account):
+        yield section
+    else:
+        for child in section.children:
+            yield from iter_accounts(child)
+
+
+def write_account(account, options):
+    # runs in an executor's worker, possibly on a copy of the account in another process
+    return AccountWriter(account, **options).write()
+
 
 class GroupHeaderWriter(BaseSingleWriter):
     model = GroupHeader
@@ -284,3 +539,109 @@ class Bai2FileWriter(BaseSectionWriter):
     header_writer_class = Bai2FileHeaderWriter
     trailer_writer_class = Bai2FileTrailerWriter
     child_writer_class = GroupWriter
+
+    def write_blocked(self, target, encoding='utf-8', block_separator=b''):
+        """
+        Writes the file as fixed length records of the header's physical_record_length,
+        wrapping the records at that length, grouped in blocks of the header's block_size
+        to a binary file object or a writable buffer.
+        Returns the number of bytes written.
+        """
+        record_length = self.obj.header.physical_record_length
+        if not record_length:
+            raise WritingException('A physical_record_length is needed to write fixed length records')
+        self.line_length = record_length
+
+        sink = BlockSink(
+            target, record_length, block_size=self.obj.header.block_size,
+            encoding=encoding, block_separator=block_separator,
+        )
+        sink.write(self.iter_lines())
+        return sink.number_of_bytes
+
+
+class Bai2StreamWriter:
+    """
+    Writes a file to a text or binary file object record by record, keeping only
+    the totals of the sections being written, e.g. to export transactions as they're read.
+
+    Each method takes either a model or the fields to create it with.
+    """
+
+    def __init__(self, fileobj, encoding='utf-8', **options):
+        """
+        Keyword arguments:
+        encoding -- encoding of the lines written to binary file objects (default utf-8)
+        options -- the keyword arguments of the record writers, e.g. line_length
+        """
+        self.sink = LineSink(fileobj, encoding=encoding)
+        self.options = options
+        # models and totals of the sections being written, outermost first
+        self._sections = []
+        self._last_record = None
+
+    def _check_section(self, model, record):
+        current_model = self._sections[-1][0] if self._sections else None
+        if current_model is not model or (model is None and self._last_record is not None):
+            after = self._last_record.__name__ if self._last_record else 'start of file'
+            raise WritingException(f'Unexpected {record.__name__} after {after}')
+
+    def _write_record(self, writer_class, obj):
+        lines = writer_class(obj, **self.options).write()
+        self.sink.write(lines)
+        self._last_record = writer_class.model
+        return len(lines)
+
+    def _begin_section(self, model, writer_class, header):
+        number_of_records = self._write_record(writer_class, header)
+        self._sections.append((model, SectionTotals(number_of_records=number_of_records)))
+
+    def _end_section(self, model, writer_class, number_of_children_field=None):
+        self._check_section(model, writer_class.model)
+        if number_of_children_field and not self._sections[-1][1].number_of_children:
+            # files need a group and groups an account
+            raise WritingException(f'Unexpected {writer_class.model.__name__} after {self._last_record.__name__}')
+        _, totals = self._sections.pop()
+        trailer = writer_class.model(number_of_records=totals.number_of_records + 1)
+        setattr(trailer, model.control_total_field, totals.control_total)
+        if number_of_children_field:
+            setattr(trailer, number_of_children_field, totals.number_of_children)
+        self._write_record(writer_class, trailer)
+
+        if self._sections:
+            parent_totals = self._sections[-1][1]
+            parent_totals.number_of_records += trailer.number_of_records
+            parent_totals.number_of_children += 1
+            parent_totals.control_total += totals.control_total
+        return trailer
+
+    def begin_file(self, header=None, **fields):
+        self._check_section(None, Bai2FileHeader)
+        self._begin_section(Bai2File, Bai2FileHeaderWriter, Bai2FileHeader(**fields) if header is None else header)
+
+    def begin_group(self, header=None, **fields):
+        self._check_section(Bai2File, GroupHeader)
+        self._begin_section(Group, GroupHeaderWriter, GroupHeader(**fields) if header is None else header)
+
+    def begin_account(self, header=None, **fields):
+        self._check_section(Group, AccountIdentifier)
+        header = AccountIdentifier(**fields) if header is None else header
+        self._begin_section(Account, AccountIdentifierWriter, header)
+        for summary in header.summary_items:
+            self._sections[-1][1].control_total += summary.amount
+
+    def add_transaction(self, transaction=None, **fields):
+        self._check_section(Account, TransactionDetail)
+        transaction = TransactionDetail(**fields) if transaction is None else transaction
+        totals = self._sections[-1][1]
+        totals.number_of_records += self._write_record(TransactionDetailWriter, transaction)
+        totals.control_total += transaction.amount
+
+    def end_account(self):
+        return self._end_section(Account, AccountTrailerWriter)
+
+    def end_group(self):
+        return self._end_section(Group, GroupTrailerWriter, 'number_of_accounts')
+
+    def end_file(self):
+        return self._end_section(Bai2File, Bai2FileTrailerWriter, 'number_of_groups')
@@ -1,8 +1,21 @@
+import asyncio
+import bz2
+import gzip
+import io
+import lzma
 import pathlib
+import tarfile
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase
 
 from bai2 import bai2
-from bai2.models import Bai2File
+from bai2.constants import EventType
+from bai2.exceptions import IntegrityException, ParsingException, WritingException
+from bai2.helpers import read_lines
+from bai2.models import Bai2File, TransactionDetail
+from bai2.parsers import AccountParser, Bai2FileParser, GroupParser, TransactionDetailParser
 from tests.test_writers import Bai2FileWriterTestCase
 
 
@@ -69,11 +82,236 @@ class ParseTestCase(TestCase):
             bai2_file = bai2.parse_from_file(f)
             self.assertTrue(isinstance(bai2_file, Bai2File))
 
+    def test_parse_from_file_with_small_buffer(self):
+        with self.open_test_file('citi_example') as f:
+            expected = bai2.parse_from_file(f).as_string()
+            f.seek(0)
+            bai2_file = bai2.parse_from_file(f, buffer_size=5)
+            self.assertEqual(bai2_file.as_string(), expected)
+
+    def test_parse_from_path(self):
+        path = pathlib.Path(__file__).parent / 'data' / 'svb_us_example.bai2'
+        bai2_file = bai2.parse_from_path(path)
+        self.assertTrue(isinstance(bai2_file, Bai2File))
+
+    def test_parse_from_path_with_mmap(self):
+        path = pathlib.Path(__file__).parent / 'data' / 'citi_example.bai2'
+        bai2_file = bai2.parse_from_path(path, use_mmap=True)
+        self.assertEqual(bai2_file.as_string(), bai2.parse_from_path(path).as_string())
+
+    def test_parse_from_compressed_path(self):
+        path = pathlib.Path(__file__).parent / 'data' / 'citi_example.bai2'
+        expected = bai2.parse_from_path(path).as_string()
+
+        with tempfile.TemporaryDirectory() as directory:
+            for suffix, compress in (('.gz', gzip.compress), ('.bz2', bz2.compress), ('.xz', lzma.compress)):
+                with self.subTest(suffix=suffix):
+                    compressed_path = pathlib.Path(directory) / f'citi_example.bai2{suffix}'
+                    compressed_path.write_bytes(compress(path.read_bytes()))
+                    self.assertEqual(bai2.parse_from_path(compressed_path).as_string(), expected)
+                    self.assertEqual(bai2.parse_from_path(compressed_path, use_mmap=True).as_string(), expected)
+
+            compressed_path = pathlib.Path(directory) / 'citi_example'
+            compressed_path.write_bytes(gzip.compress(path.read_bytes()))
+            self.assertEqual(bai2.parse_from_path(compressed_path, compression='gzip').as_string(), expected)
+
+    def test_iter_from_zip_archive(self):
+        data = pathlib.Path(__file__).parent / 'data'
+        names = ['citi_example.bai2', 'nwb_example.bai2.gz']
+
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zip_file:
+            zip_file.writestr('citi_example.bai2', (data / 'citi_example.bai2').read_bytes())
+            zip_file.writestr('nwb_example.bai2.gz', gzip.compress((data / 'nwb_example.bai2').read_bytes()))
+            zip_file.writestr('empty/', b'')
+        archive.seek(0)
+
+        bai2_files = bai2.iter_from_archive(archive)
+        self.assertEqual(
+            [(name, bai2_file.as_string()) for name, bai2_file in bai2_files],
+            [(name, bai2.parse_from_path(data / name.removesuffix('.gz')).as_string()) for name in names],
+        )
+
+    def test_iter_from_tar_archive_file_object(self):
+        data = pathlib.Path(__file__).parent / 'data'
+
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w:gz') as tar_file:
+            tar_file.add(data / 'nwb_example.bai2', arcname='nwb_example.bai2')
+        archive.seek(0)
+
+        bai2_files = list(bai2.iter_from_archive(archive))
+        self.assertEqual([name for name, bai2_file in bai2_files], ['nwb_example.bai2'])
+        self.assertEqual(bai2_files[0][1].as_string(), bai2.parse_from_path(data / 'nwb_example.bai2').as_string())
+
+    def test_iter_from_tar_archive(self):
+        data = pathlib.Path(__file__).parent / 'data'
+        names = ['citi_example.bai2', 'nwb_example.bai2', 'svb_us_example.bai2']
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = pathlib.Path(directory) / 'examples.tar.xz'
+            with tarfile.open(path, 'w:xz') as tar_file:
+                for name in names:
+                    tar_file.add(data / name, arcname=f'examples/{name}')
+
+            bai2_files = bai2.iter_from_archive(path)
+            name, bai2_file = next(bai2_files)
+            self.assertEqual(name, 'examples/citi_example.bai2')
+            self.assertEqual(bai2_file.as_string(), bai2.parse_from_path(data / names[0]).as_string())
+            self.assertEqual([name for name, bai2_file in bai2_files], [f'examples/{name}' for name in names[1:]])
+
+    @staticmethod
+    async def parse_stream(parse, content, **kwargs):
+        reader = asyncio.StreamReader()
+        reader.feed_data(content)
+        reader.feed_eof()
+        return await parse(reader, **kwargs)
+
+    @staticmethod
+    async def collect_events(source, **kwargs):
+        return [event async for event in bai2.aparse(source, **kwargs)]
+
+    def test_aparse_file(self):
+        path = pathlib.Path(__file__).parent / 'data' / 'nwb_example.bai2'
+
+        bai2_file = asyncio.run(self.parse_stream(bai2.aparse_file, path.read_bytes(), buffer_size=7))
+        self.assertEqual(bai2_file.as_string(), bai2.parse_from_path(path).as_string())
+
+    def test_aparse(self):
+        path = pathlib.Path(__file__).parent / 'data' / 'svb_us_example.bai2'
+        with path.open() as f:
+            expected = list(bai2.iter_events(read_lines(f)))
+
+        events = asyncio.run(self.parse_stream(self.collect_events, path.read_bytes()))
+        self.assertEqual(
+            [(event.type, event.obj.rows) for event in events],
+            [(event.type, event.obj.rows) for event in expected],
+        )
+
+    def test_aparse_blocked(self):
+        bai2_file = Bai2FileWriterTestCase.create_bai2_file()
+        bai2_file.header.physical_record_length = 80
+        f = io.BytesIO()
+        bai2.write_blocked(bai2_file, f)
+
+        parsed = asyncio.run(self.parse_stream(bai2.aparse_file, f.getvalue()))
+        self.assertEqual(parsed.as_string(), bai2.parse_from_buffer(f.getvalue()).as_string())
+
+    def test_aparse_same_errors(self):
+        path = pathlib.Path(__file__).parent / 'data' / 'citi_example.bai2'
+        lines = path.read_text().splitlines()
+        for content in ('\n'.join(lines[:-1]), '\n'.join(lines[:5]), '\n'.join(lines[1:])):
+            with self.assertRaises(ParsingException) as expected:
+                bai2.parse_from_string(content)
+            with self.assertRaises(ParsingException) as raised:
+                asyncio.run(self.parse_stream(bai2.aparse_file, content.encode()))
+            self.assertEqual(str(raised.exception), str(expected.exception))
+
+    def test_aparse_gives_control_back(self):
+        path = pathlib.Path(__file__).parent / 'data' / 'nwb_example.bai2'
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(None)
+                await asyncio.sleep(0)
+
+        async def parse():
+            ticker = asyncio.ensure_future(tick())
+            await asyncio.sleep(0)
+            number_of_ticks = len(ticks)
+            await self.parse_stream(bai2.aparse_file, path.read_bytes(), events_per_yield=2)
+            ticker.cancel()
+            return len(ticks) - number_of_ticks
+
+        self.assertGreater(asyncio.run(parse()), 2)
+
+    def test_parse_many(self):
+        data = pathlib.Path(__file__).parent / 'data'
+        paths = sorted(data.glob('*.bai2'))
+
+        results = list(bai2.parse_many(paths, workers=2, chunksize=2))
+
+        self.assertEqual([result.path for result in results], paths)
+        for result in results:
+            self.assertIsNone(result.exception)
+            self.assertEqual(result.bai2_file.as_string(), bai2.parse_from_path(result.path).as_string())
+            self.assertGreaterEqual(result.duration, 0)
+
+    def test_parse_many_as_completed_with_exceptions(self):
+        data = pathlib.Path(__file__).parent / 'data'
+        paths = [data / 'citi_example.bai2', data / 'missing.bai2', data / 'nwb_example.bai2']
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(bai2.parse_many(paths, ordered=False, executor=executor, check_integrity=False))
+
+        self.assertEqual(sorted(result.path for result in results), sorted(paths))
+        failed = [result for result in results if result.exception is not None]
+        self.assertEqual([result.path for result in failed], [data / 'missing.bai2'])
+        self.assertIsInstance(failed[0].exception, FileNotFoundError)
+        self.assertIsNone(failed[0].bai2_file)
+
+    def test_parse_from_buffer(self):
+        path = pathlib.Path(__file__).parent / 'data' / 'nwb_example.bai2'
+        expected = bai2.parse_from_path(path).as_string()
+
+        content = path.read_bytes()
+        self.assertEqual(bai2.parse_from_buffer(content).as_string(), expected)
+        self.assertEqual(bai2.parse_from_buffer(memoryview(content)).as_string(), expected)
+
     def test_parse_from_file_with_known_parsing_issue(self):
         with self.open_test_file('account_trailer_amount_blank_example') as f:
             bai2_file = bai2.parse_from_file(f)
             self.assertTrue(isinstance(bai2_file, Bai2File))
 
+    def test_iter_events(self):
+        with self.open_test_file('nwb_example') as f:
+            bai2_file = bai2.parse_from_file(f)
+            f.seek(0)
+            events = list(bai2.iter_events(line.strip() for line in f if line.strip()))
+
+        self.assertEqual(events[0].type, EventType.file_header)
+        self.assertEqual(events[-1].type, EventType.file_end)
+        self.assertEqual(
+            len([event for event in events if event.type == EventType.group_start]),
+            len(bai2_file.children),
+        )
+        self.assertEqual(
+            len([event for event in events if event.type == EventType.transaction]),
+            sum(len(account.children) for group in bai2_file.children for account in group.children),
+        )
+
+    def test_parse_without_retaining_rows(self):
+        with self.open_test_file('citi_example') as f:
+            bai2_file = bai2.parse_from_file(f, retain_rows=False)
+
+        group = bai2_file.children[0]
+        account = group.children[0]
+        self.assertEqual(bai2_file.header.rows, ())
+        self.assertEqual(account.children[0].rows, ())
+        self.assertEqual(account.children[0].number_of_rows, 8)
+        self.assertEqual(account.number_of_rows, account.trailer.number_of_records)
+        self.assertEqual(group.number_of_rows, group.trailer.number_of_records)
+        self.assertEqual(bai2_file.number_of_rows, bai2_file.trailer.number_of_records)
+
+    def test_parse_without_retaining_rows_checks_number_of_records(self):
+        s = (
+            '01,CITIDIRECT,8888888,150716,0713,00131100,,,2/\n'
+            '02,8888888,CITIGB00,1,150715,2340,GBP,2/\n'
+            '03,77777777,GBP,010,10000,,,015,10000,,,/\n'
+            '16,191,001,V,150715,,1234567890,RP12312312312312/\n'
+            '88,FR:FP SIP INCOMING\n'
+            '49,20001,4/\n'
+            '98,20001,1,6/\n'
+            '99,20001,1,8/\n'
+        )
+
+        self.assertTrue(isinstance(bai2.parse_from_string(s, retain_rows=False), Bai2File))
+        self.assertRaises(
+            IntegrityException,
+            bai2.parse_from_string, s.replace('49,20001,4/', '49,20001,5/'), retain_rows=False,
+        )
+
     def test_as_string(self):
         original = (
             '01,CITIDIRECT,8888888,150716,0713,00131100,,,2/\n'
@@ -180,3 +418,148 @@ class WriteTestCase(TestCase):
                 '99,94396,2,26/'
             ),
         )
+
+    def test_write_to_text_file(self):
+        bai2_file = Bai2FileWriterTestCase.create_bai2_file()
+        expected = bai2.write(bai2_file)
+
+        f = io.StringIO()
+        number_of_lines = bai2.write_to_file(Bai2FileWriterTestCase.create_bai2_file(), f)
+        self.assertEqual(f.getvalue(), expected)
+        self.assertEqual(number_of_lines, 26)
+
+    def test_write_to_binary_file(self):
+        bai2_file = Bai2FileWriterTestCase.create_bai2_file()
+        expected = bai2.write(bai2_file)
+
+        f = io.BytesIO()
+        bai2.write_to_file(Bai2FileWriterTestCase.create_bai2_file(), f)
+        self.assertEqual(f.getvalue(), expected.encode())
+
+    def test_write_bytes(self):
+        expected = bai2.write(Bai2FileWriterTestCase.create_bai2_file())
+
+        self.assertEqual(bai2.write_bytes(Bai2FileWriterTestCase.create_bai2_file()), expected.encode())
+        output = bai2.write_bytes(Bai2FileWriterTestCase.create_bai2_file(), encoding='ascii', line_terminator='\r\n')
+        self.assertEqual(output, expected.replace('\n', '\r\n').encode('ascii'))
+
+    def test_write_compressed(self):
+        expected = bai2.write(Bai2FileWriterTestCase.create_bai2_file()).encode()
+
+        for compression, decompress in (('gzip', gzip.decompress), ('bz2', bz2.decompress), ('lzma', lzma.decompress)):
+            with self.subTest(compression=compression):
+                output = bai2.write_bytes(Bai2FileWriterTestCase.create_bai2_file(), compression=compression)
+                self.assertEqual(decompress(output), expected)
+
+                f = io.BytesIO()
+                number_of_lines = bai2.write_to_file(
+                    Bai2FileWriterTestCase.create_bai2_file(), f, compression=compression,
+                )
+                self.assertEqual(decompress(f.getvalue()), expected)
+                self.assertEqual(number_of_lines, 26)
+
+    def test_write_compressed_to_text_file(self):
+        with self.assertRaisesRegex(WritingException, 'binary'):
+            bai2.write_to_file(Bai2FileWriterTestCase.create_bai2_file(), io.StringIO(), compression='gzip')
+        with self.assertRaisesRegex(WritingException, 'Unknown compression'):
+            bai2.write_bytes(Bai2FileWriterTestCase.create_bai2_file(), compression='zip')
+
+    def test_write_to_path(self):
+        expected = bai2.write(Bai2FileWriterTestCase.create_bai2_file()).encode()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = pathlib.Path(directory) / 'output.bai2.gz'
+            bai2.write_to_path(Bai2FileWriterTestCase.create_bai2_file(), path)
+            self.assertEqual(gzip.decompress(path.read_bytes()), expected)
+
+            path = pathlib.Path(directory) / 'output.bai2'
+            bai2.write_to_path(Bai2FileWriterTestCase.create_bai2_file(), path)
+            self.assertEqual(path.read_bytes(), expected)
+
+    def test_write_passthrough(self):
+        path = pathlib.Path(__file__).parent / 'data' / 'nwb_example.bai2'
+        bai2_file = bai2.parse_from_path(path, track_changes=True)
+        original = bai2_file.as_string()
+
+        self.assertEqual(bai2.write(bai2_file, passthrough=True), original)
+
+        account = bai2_file.children[0].children[0]
+        account.children[0].amount += 100
+        output = bai2.write(bai2_file, passthrough=True).splitlines()
+
+        changed = [line for line in output if line not in original.splitlines()]
+        # only the transaction, wrapped with a continuation record, and the trailers are written again
+        self.assertEqual([line[:3] for line in changed], ['16,', '88,', '49,', '98,', '99,'])
+        self.assertEqual(changed[2], f'49,{account.trailer.account_control_total},{account.trailer.number_of_records}/')
+
+    def test_write_passthrough_subclassed_models(self):
+        class NotedTransactionDetail(TransactionDetail):
+            __slots__ = ('note',)
+
+        class NotedTransactionDetailParser(TransactionDetailParser):
+            model = NotedTransactionDetail
+
+        class NotedAccountParser(AccountParser):
+            child_parser_class = NotedTransactionDetailParser
+
+        class NotedGroupParser(GroupParser):
+            child_parser_class = NotedAccountParser
+
+        class NotedBai2FileParser(Bai2FileParser):
+            child_parser_class = NotedGroupParser
+
+        path = pathlib.Path(__file__).parent / 'data' / 'nwb_example.bai2'
+        bai2_file = bai2.parse_from_path(path, track_changes=True, parser_class=NotedBai2FileParser)
+        transaction = bai2_file.children[0].children[0].children[0]
+        self.assertIsInstance(transaction, NotedTransactionDetail)
+
+        transaction.amount += 1000
+        output = bai2.write(bai2_file, passthrough=True)
+        self.assertEqual(bai2.parse_from_string(output).children[0].children[0].children[0].amount, transaction.amount)
+
+    def test_write_blocked(self):
+        bai2_file = Bai2FileWriterTestCase.create_bai2_file()
+        bai2_file.header.physical_record_length = 60
+        bai2_file.header.block_size = 4
+        lines = bai2.write(bai2_file, line_length=60).splitlines()
+
+        f = io.BytesIO()
+        number_of_bytes = bai2.write_blocked(bai2_file, f, block_separator=b'\n')
+        blocks = f.getvalue().split(b'\n')
+
+        self.assertEqual(number_of_bytes, len(f.getvalue()))
+        self.assertEqual(len(lines), 26)
+        self.assertEqual([len(block) for block in blocks], [240] * 6 + [120])
+        records = [block[i:i + 60] for block in blocks for i in range(0, len(block), 60)]
+        self.assertEqual(records, [line.encode().ljust(60) for line in lines])
+
+    def test_write_blocked_to_buffer(self):
+        bai2_file = Bai2FileWriterTestCase.create_bai2_file()
+        bai2_file.header.physical_record_length = 80
+
+        f = io.BytesIO()
+        bai2.write_blocked(bai2_file, f)
+        buffer = bytearray(len(f.getvalue()))
+        bai2.write_blocked(bai2_file, buffer)
+
+        self.assertEqual(bytes(buffer), f.getvalue())
+        self.assertEqual(len(buffer), 26 * 80)
+        with self.assertRaisesRegex(WritingException, 'too small'):
+            bai2.write_blocked(bai2_file, bytearray(100))
+
+    def test_write_blocked_without_physical_record_length(self):
+        with self.assertRaises(WritingException):
+            bai2.write_blocked(Bai2FileWriterTestCase.create_bai2_file(), io.BytesIO())
+
+    def test_parse_blocked(self):
+        bai2_file = Bai2FileWriterTestCase.create_bai2_file()
+        bai2_file.header.physical_record_length = 80
+        bai2_file.header.block_size = 4
+        f = io.BytesIO()
+        bai2.write_blocked(bai2_file, f)
+        expected = bai2.write(bai2.parse_from_string(bai2.write(bai2_file)))
+
+        self.assertNotIn(b'\n', f.getvalue())
+        self.assertEqual(bai2.write(bai2.parse_from_buffer(f.getvalue())), expected)
+        self.assertEqual(bai2.write(bai2.parse_from_string(f.getvalue().decode())), expected)
+        self.assertEqual(bai2.write(bai2.parse_from_file(io.StringIO(f.getvalue().decode()), buffer_size=64)), expected)
@@ -0,0 +1,255 @@
+import asyncio
+import io
+from unittest import TestCase
+
+from bai2.constants import RecordCode
+from bai2.helpers import (
+    _build_account_identifier_record,
+    _build_generic_record,
+    aread_lines,
+    buffer_record_generator,
+    get_fixed_record_length,
+    read_lines,
+    record_generator,
+    split_fixed_length_lines,
+)
+
+
+class ReadLinesTestCase(TestCase):
+    content = (
+        '01,123456,123456,220310,0022,1,,,2/   \r\n'
+        '\r\n'
+        '02,,123456,1,220309,,USD,2/\n'
+        '03,654321,USD,010,10372793,,,015,11384293,,/\r'
+        '49,22768586,3/'
+    )
+    expected = [
+        '01,123456,123456,220310,0022,1,,,2/',
+        '02,,123456,1,220309,,USD,2/',
+        '03,654321,USD,010,10372793,,,015,11384293,,/',
+        '49,22768586,3/',
+    ]
+
+    def test_read_lines(self):
+        lines = read_lines(io.StringIO(self.content))
+        self.assertEqual(list(lines), self.expected)
+
+    def test_read_lines_with_small_buffer(self):
+        for buffer_size in range(1, 12):
+            lines = read_lines(io.StringIO(self.content), buffer_size)
+            self.assertEqual(list(lines), self.expected, f'buffer size {buffer_size}')
+
+    def test_read_lines_is_lazy(self):
+        f = io.StringIO(self.content * 100)
+        lines = read_lines(f, buffer_size=64)
+
+        self.assertEqual(next(lines), self.expected[0])
+        self.assertLess(f.tell(), 128)
+
+
+class AsyncReadLinesTestCase(TestCase):
+    content = ReadLinesTestCase.content + ',\u00e9'
+    expected = ReadLinesTestCase.expected[:-1] + ['49,22768586,3/,\u00e9']
+
+    @staticmethod
+    async def read_all(source, **kwargs):
+        return [line async for line in aread_lines(source, **kwargs)]
+
+    @staticmethod
+    async def iter_chunks(content, chunk_size):
+        for start in range(0, len(content), chunk_size):
+            yield content[start:start + chunk_size]
+
+    def test_read_chunks_of_text(self):
+        for chunk_size in range(1, 12):
+            lines = asyncio.run(self.read_all(self.iter_chunks(self.content, chunk_size)))
+            self.assertEqual(lines, self.expected, f'chunk size {chunk_size}')
+
+    def test_read_chunks_of_bytes(self):
+        content = self.content.encode()
+        for chunk_size in range(1, 12):
+            lines = asyncio.run(self.read_all(self.iter_chunks(content, chunk_size)))
+            self.assertEqual(lines, self.expected, f'chunk size {chunk_size}')
+
+    def test_read_stream_reader(self):
+        async def read_stream():
+            reader = asyncio.StreamReader()
+            reader.feed_data(self.content.encode('latin-1'))
+            reader.feed_eof()
+            return await self.read_all(reader, encoding='latin-1', buffer_size=5)
+
+        self.assertEqual(asyncio.run(read_stream()), self.expected)
+
+
+class BufferRecordGeneratorTestCase(TestCase):
+    lines = [
+        '16,115,10000000,S,5000000,4000000,1000000/',
+        '88,AX13612,B096132,AMALGAMATED CORP. LOCKBOX',
+        '88,DEPOSIT-MISC. RECEIVABLES',
+        '49,82000000,6/',
+    ]
+
+    def assert_records_equal(self, records, expected_records):
+        records = list(records)
+        expected_records = list(expected_records)
+        self.assertEqual(len(records), len(expected_records))
+        for record, expected_record in zip(records, expected_records):
+            self.assertEqual(record.code, expected_record.code)
+            self.assertEqual(record.fields, expected_record.fields)
+            self.assertEqual(record.rows, expected_record.rows)
+
+    def test_bytes(self):
+        buffer = '\r\n  \r\n'.join(self.lines).encode()
+        self.assert_records_equal(
+            buffer_record_generator(buffer),
+            record_generator(self.lines),
+        )
+
+    def test_memoryview(self):
+        buffer = memoryview('\n'.join(self.lines).encode())
+        self.assert_records_equal(
+            buffer_record_generator(buffer),
+            record_generator(self.lines),
+        )
+
+    def test_decodes_rows(self):
+        buffer = '16,115,100,,,,CAFÉ\n'.encode('latin-1')
+        record = next(buffer_record_generator(buffer, encoding='latin-1'))
+        self.assertEqual(record.code, RecordCode.transaction_detail)
+        self.assertEqual(record.fields[-1], 'CAFÉ')
+
+    def test_unknown_record_code(self):
+        records = buffer_record_generator(b'17,115,100/')
+        self.assertRaises(ValueError, next, records)
+
+
+class FixedLengthRecordsTestCase(TestCase):
+    lines = [
+        '01,SENDER,RECEIVER,150716,0713,1,45,2,2/',
+        '02,,RECEIVER,1,150715,,GBP,2/',
+        '03,77777777,GBP/',
+        '16,399,100,,,,SOME',
+        '88,TEXT',
+        '49,100,4/',
+    ]
+
+    def setUp(self):
+        # blocks of two records of 45 characters
+        self.blocks = [
+            self.lines[i].ljust(45) + self.lines[i + 1].ljust(45)
+            for i in range(0, len(self.lines), 2)
+        ]
+
+    def test_get_fixed_record_length(self):
+        self.assertEqual(get_fixed_record_length(self.blocks[0]), 45)
+        self.assertIsNone(get_fixed_record_length(self.lines[0]))
+        self.assertIsNone(get_fixed_record_length(self.lines[0].ljust(45)))
+        self.assertIsNone(get_fixed_record_length('01,SENDER,RECEIVER,150716,0713,1,,,2/'))
+        self.assertIsNone(get_fixed_record_length(self.lines[1]))
+        self.assertIsNone(get_fixed_record_length('01,SENDER,RECEIVER,150716,0713,1,20,2,2/'))
+
+    def test_split_fixed_length_lines(self):
+        self.assertEqual(list(split_fixed_length_lines(self.blocks)), self.lines)
+        self.assertEqual(list(split_fixed_length_lines([''.join(self.blocks)])), self.lines)
+        self.assertEqual(list(split_fixed_length_lines(self.lines)), self.lines)
+        self.assertEqual(list(split_fixed_length_lines([])), [])
+
+    def test_buffer_record_generator(self):
+        for separator in ('', '\n', '\r\n'):
+            buffer = separator.join(self.blocks).encode()
+            BufferRecordGeneratorTestCase.assert_records_equal(
+                self,
+                buffer_record_generator(buffer),
+                record_generator(self.lines),
+            )
+
+    def test_buffer_record_generator_with_leading_whitespace(self):
+        # more whitespace than the padding of the first record
+        for separator in ('', '\n', '\r\n', '\n' + ' ' * 8):
+            buffer = (' ' * 8 + separator.join(self.blocks)).encode()
+            BufferRecordGeneratorTestCase.assert_records_equal(
+                self,
+                buffer_record_generator(buffer),
+                record_generator(self.lines),
+            )
+            self.assertEqual(list(read_lines(io.StringIO(buffer.decode()), 7)), self.lines)
+
+    def test_read_lines(self):
+        for separator in ('', '\n', '\r\n'):
+            content = separator.join(self.blocks)
+            for buffer_size in (1, 7, 45, 100, 8192):
+                lines = read_lines(io.StringIO(content), buffer_size)
+                self.assertEqual(list(lines), self.lines, f'buffer size {buffer_size}')
+
+    def test_read_lines_splits_records_as_they_are_read(self):
+        f = io.StringIO(''.join(self.blocks) * 100)
+        lines = read_lines(f, buffer_size=100)
+
+        self.assertEqual(next(lines), self.lines[0])
+        self.assertLess(f.tell(), 200)
+
+    def test_aread_lines(self):
+        content = ''.join(self.blocks).encode()
+        for chunk_size in (1, 7, 45, 100):
+            chunks = AsyncReadLinesTestCase.iter_chunks(content, chunk_size)
+            lines = asyncio.run(AsyncReadLinesTestCase.read_all(chunks))
+            self.assertEqual(lines, self.lines, f'chunk size {chunk_size}')
+
+
+class BuildRecordTestCase(TestCase):
+    def test_generic_record(self):
+        record = _build_generic_record([
+            (RecordCode.transaction_detail, '115,10000000,S,5000000,4000000,1000000/'),
+            (RecordCode.continuation, 'AX13612,B096132,AMALGAMATED CORP. LOCKBOX'),
+            (RecordCode.continuation, ''),
+            (RecordCode.continuation, 'DEPOSIT-MISC. RECEIVABLES'),
+        ])
+
+        self.assertEqual(record.code, RecordCode.transaction_detail)
+        self.assertEqual(
+            record.fields,
+            [
+                '115', '10000000', 'S', '5000000', '4000000', '1000000',
+                'AX13612', 'B096132', 'AMALGAMATED CORP. LOCKBOX DEPOSIT-MISC. RECEIVABLES',
+            ],
+        )
+
+    def test_generic_record_single_row(self):
+        self.assertEqual(
+            _build_generic_record([(RecordCode.account_trailer, '72000000,3/')]).fields,
+            ['72000000', '3'],
+        )
+        self.assertEqual(
+            _build_generic_record([(RecordCode.account_trailer, '72000000,3')]).fields,
+            ['72000000', '3'],
+        )
+        self.assertEqual(_build_generic_record([(RecordCode.account_trailer, '')]).fields, [''])
+
+    def test_generic_record_with_long_continuation(self):
+        rows = [(RecordCode.transaction_detail, '195,100,0,,,REMITTANCE')]
+        rows += [(RecordCode.continuation, f'LINE {n}') for n in range(1000)]
+
+        record = _build_generic_record(rows)
+
+        self.assertEqual(record.fields[:5], ['195', '100', '0', '', ''])
+        self.assertEqual(
+            record.fields[5],
+            ' '.join(['REMITTANCE'] + [f'LINE {n}' for n in range(1000)]),
+        )
+
+    def test_account_identifier_record(self):
+        record = _build_account_identifier_record([
+            (RecordCode.account_identifier, '0975312468,GBP,010,500000,,/'),
+            (RecordCode.continuation, '015,10000,,,/'),
+            (RecordCode.continuation, '190,70000000,4,0/'),
+        ])
+
+        self.assertEqual(
+            record.fields,
+            [
+                '0975312468', 'GBP',
+                '010', '500000', '', '',
+                '015', '10000', '', '',
+                '190', '70000000', '4', '0', '',
+            ],
+        )
@@ -0,0 +1,198 @@
+import pickle
+from unittest import TestCase, mock
+
+from bai2 import bai2, constants, models
+
+
+class SingleModelTestCase(TestCase):
+    def test_models_are_slotted(self):
+        for model in (
+            models.Bai2FileHeader(),
+            models.Bai2FileTrailer(),
+            models.GroupHeader(),
+            models.GroupTrailer(),
+            models.AccountIdentifier(),
+            models.AccountTrailer(),
+            models.TransactionDetail(),
+            models.Summary(),
+        ):
+            self.assertFalse(hasattr(model, '__dict__'), model.__class__.__name__)
+
+    def test_fields(self):
+        transaction = models.TransactionDetail(
+            [(constants.RecordCode.transaction_detail, '165,100,0,,,TEXT')],
+            type_code=constants.TypeCodes['165'],
+            amount=100,
+            text='TEXT',
+        )
+
+        self.assertEqual(transaction.amount, 100)
+        self.assertEqual(transaction.text, 'TEXT')
+        self.assertIsNone(transaction.bank_reference)
+        self.assertEqual(transaction.as_string(), '16,165,100,0,,,TEXT')
+
+        transaction.amount = 200
+        self.assertEqual(transaction.amount, 200)
+
+    def test_modified(self):
+        transaction = models.TransactionDetail(amount=100, availability={'0': 100})
+        self.assertTrue(transaction.modified)
+
+        transaction.track_changes()
+        self.assertFalse(transaction.modified)
+
+        transaction.availability['0'] = 50
+        self.assertTrue(transaction.modified)
+
+        transaction.availability['0'] = 100
+        self.assertFalse(transaction.modified)
+
+        transaction.text = 'TEXT'
+        self.assertTrue(transaction.modified)
+
+    def test_modified_subclasses(self):
+        class NotedTransactionDetail(models.TransactionDetail):
+            __slots__ = ('note',)
+
+        class SlottedTransactionDetail(models.TransactionDetail):
+            __slots__ = ()
+
+        class UnslottedTransactionDetail(models.TransactionDetail):
+            pass
+
+        for model in (NotedTransactionDetail, SlottedTransactionDetail, UnslottedTransactionDetail):
+            with self.subTest(model=model.__name__):
+                transaction = model(amount=100)
+                transaction.track_changes()
+                self.assertFalse(transaction.modified)
+
+                transaction.amount = 200
+                self.assertTrue(transaction.modified)
+
+        for model in (NotedTransactionDetail, UnslottedTransactionDetail):
+            with self.subTest(model=model.__name__):
+                transaction = model(amount=100)
+                transaction.track_changes()
+                transaction.note = 'NOTE'
+                self.assertTrue(transaction.modified)
+
+    def test_modified_summary(self):
+        account_identifier = models.AccountIdentifier(
+            summary_items=[models.Summary(type_code=constants.TypeCodes['010'], amount=10000)],
+        )
+        account_identifier.track_changes()
+        self.assertFalse(account_identifier.modified)
+
+        account_identifier.summary_items[0].amount = 20000
+        self.assertTrue(account_identifier.modified)
+
+    def test_pickle(self):
+        account_identifier = models.AccountIdentifier(
+            customer_account_number='77777777',
+            summary_items=[models.Summary(type_code=constants.TypeCodes['010'], amount=10000)],
+        )
+
+        copy = pickle.loads(pickle.dumps(account_identifier))
+
+        self.assertEqual(copy.customer_account_number, '77777777')
+        self.assertEqual(copy.summary_items[0].amount, 10000)
+
+
+class SectionModelTotalsTestCase(TestCase):
+    @staticmethod
+    def create_transaction(amount):
+        return models.TransactionDetail(type_code=constants.TypeCodes['399'], amount=amount)
+
+    def test_totals_kept_up_to_date(self):
+        bai2_file = models.Bai2File()
+        group = models.Group()
+        bai2_file.add_group(group)
+        account = models.Account(children=[self.create_transaction(100)])
+        group.add_account(account)
+
+        self.assertEqual(account.trailer.account_control_total, 100)
+        self.assertEqual(group.trailer.group_control_total, 100)
+        self.assertEqual(group.trailer.number_of_accounts, 1)
+        self.assertEqual(bai2_file.trailer.file_control_total, 100)
+        self.assertEqual(bai2_file.trailer.number_of_groups, 1)
+
+        transaction = self.create_transaction(50)
+        account.add_transaction(transaction)
+        group.add_account(models.Account(children=[self.create_transaction(7)]))
+        bai2_file.add_group(models.Group())
+
+        self.assertEqual(account.trailer.account_control_total, 150)
+        self.assertEqual(group.trailer.group_control_total, 157)
+        self.assertEqual(group.trailer.number_of_accounts, 2)
+        self.assertEqual(bai2_file.trailer.file_control_total, 157)
+        self.assertEqual(bai2_file.trailer.number_of_groups, 2)
+
+        account.remove_transaction(transaction)
+
+        self.assertEqual(account.trailer.account_control_total, 100)
+        self.assertEqual(group.trailer.group_control_total, 107)
+        self.assertEqual(bai2_file.trailer.file_control_total, 107)
+
+    def test_parsed_totals_kept_up_to_date(self):
+        with open('tests/data/nwb_example.bai2') as f:
+            bai2_file = bai2.parse_from_file(f)
+        file_control_total = bai2_file.trailer.file_control_total
+        account = bai2_file.children[0].children[0]
+
+        account.add_transaction(self.create_transaction(100))
+
+        self.assertEqual(bai2_file.trailer.file_control_total, file_control_total + 100)
+
+    def test_writing_skips_kept_up_to_date_totals(self):
+        bai2_file = models.Bai2File()
+        group = models.Group()
+        bai2_file.add_group(group)
+        group.add_account(models.Account(children=[self.create_transaction(100)]))
+        expected = bai2.write(bai2_file)
+
+        with mock.patch.object(models.Account, 'update_totals') as update_totals:
+            self.assertEqual(bai2.write(bai2_file, trust_totals=True), expected)
+        update_totals.assert_not_called()
+
+    def test_amounts_changed_directly_updates_totals_when_writing(self):
+        bai2_file = models.Bai2File()
+        group = models.Group()
+        bai2_file.add_group(group)
+        account = models.Account()
+        group.add_account(account)
+        transaction = self.create_transaction(100)
+        account.add_transaction(transaction)
+
+        transaction.amount = 1000
+
+        output = bai2.write(bai2_file)
+        self.assertEqual(account.trailer.account_control_total, 1000)
+        self.assertEqual(bai2_file.trailer.file_control_total, 1000)
+        self.assertEqual(bai2.parse_from_string(output).trailer.file_control_total, 1000)
+
+    def test_children_changed_directly_updates_totals_when_writing(self):
+        bai2_file = models.Bai2File()
+        group = models.Group()
+        bai2_file.add_group(group)
+        account = models.Account()
+        group.add_account(account)
+
+        account.children.append(self.create_transaction(100))
+
+        self.assertTrue(account.totals_outdated)
+        bai2.write(bai2_file)
+        self.assertEqual(account.trailer.account_control_total, 100)
+        self.assertEqual(bai2_file.trailer.file_control_total, 100)
+
+    def test_pickled_sections_keep_parents(self):
+        bai2_file = models.Bai2File()
+        bai2_file.add_group(models.Group())
+        bai2_file.children[0].add_account(models.Account(children=[self.create_transaction(100)]))
+
+        account = pickle.loads(pickle.dumps(bai2_file.children[0].children[0]))
+        self.assertIsNone(account.parent)
+
+        copy = pickle.loads(pickle.dumps(bai2_file))
+        copy.children[0].children[0].add_transaction(self.create_transaction(50))
+        self.assertEqual(copy.trailer.file_control_total, 150)
+        self.assertEqual(bai2_file.trailer.file_control_total, 100)
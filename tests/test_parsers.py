@@ -1,9 +1,13 @@
 import datetime
+import threading
+import time
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from unittest import TestCase, mock
 
 from bai2.constants import (
     AsOfDateModifier,
+    EventType,
     FundsType,
     GroupStatus,
     TypeCode,
@@ -25,7 +29,45 @@ from bai2.models import (
     GroupTrailer,
     TransactionDetail,
 )
-from bai2.parsers import AccountParser, Bai2FileParser, GroupParser, TransactionDetailParser
+from bai2.parsers import (
+    AccountIdentifierParser,
+    AccountParser,
+    Bai2FileParser,
+    GroupHeaderParser,
+    GroupParser,
+    ParallelParser,
+    PipelinedParser,
+    StateMachineParser,
+    TransactionDetailParser,
+    compile_fields_decoder,
+)
+
+
+class CompileFieldsDecoderTestCase(TestCase):
+    def test_decode(self):
+        decode = compile_fields_decoder([
+            'name',
+            ('count', int),
+            ('control_total', int),
+            ('date', lambda value: f'parsed {value}'),
+        ])
+
+        self.assertEqual(
+            decode(['A', '2', '300', 'today', 'ignored']),
+            {'name': 'A', 'count': 2, 'control_total': 300, 'date': 'parsed today'},
+        )
+        self.assertEqual(
+            decode(['', '', '', '']),
+            {'name': None, 'count': None, 'control_total': 0, 'date': None},
+        )
+        self.assertRaises(IndexError, decode, ['A'])
+
+    def test_compiled_for_parser_classes(self):
+        fields = GroupHeaderParser.decode_fields(['1', '2', '1', '040620', '2359', 'GBP', '2'])
+        self.assertEqual(fields['group_status'], GroupStatus.update)
+        self.assertEqual(fields['as_of_date'], datetime.date(2004, 6, 20))
+        self.assertEqual(fields['as_of_time'], datetime.time(23, 59))
+        self.assertEqual(fields['as_of_date_modifier'], AsOfDateModifier.final_previous_day)
 
 
 class TransactionDetailParserTestCase(TestCase):
@@ -228,6 +270,45 @@ class TransactionDetailParserTestCase(TestCase):
         self.assertEqual(transaction.text, 'DEALER PAYMENTS')
 
 
+class AccountIdentifierParserTestCase(TestCase):
+    def test_parse_summary_items_with_availability(self):
+        lines = [
+            '03,0975312468,GBP,010,500000,,,100,1000,2,D,2,0,600,1,400,400,3000,4,S,1000,1000,1000/',
+            '88,015,200,,V,040621,1200,190,70000000,4,0/',
+        ]
+
+        parser = AccountIdentifierParser(IteratorHelper(lines))
+
+        header = parser.parse()
+
+        self.assertEqual(header.customer_account_number, '0975312468')
+        self.assertEqual(
+            [(summary.type_code.code, summary.amount, summary.funds_type) for summary in header.summary_items],
+            [
+                ('010', 500000, None),
+                ('100', 1000, FundsType.distributed_availability),
+                ('400', 3000, FundsType.distributed_availability_simple),
+                ('015', 200, FundsType.value_dated),
+                ('190', 70000000, FundsType.immediate_availability),
+            ],
+        )
+        summary_items = header.summary_items
+        self.assertEqual(summary_items[1].availability, OrderedDict([('0', 600), ('1', 400)]))
+        self.assertEqual(summary_items[2].availability, OrderedDict([('0', 1000), ('1', 1000), ('>1', 1000)]))
+        self.assertEqual(
+            summary_items[3].availability,
+            OrderedDict([('date', datetime.date(2004, 6, 21)), ('time', datetime.time(12, 0))]),
+        )
+
+    def test_fails_on_missing_availability(self):
+        lines = [
+            '03,0975312468,GBP,100,1000,2,D,2,0,600/',
+        ]
+
+        parser = AccountIdentifierParser(IteratorHelper(lines))
+        self.assertRaises(IndexError, parser.parse)
+
+
 class AccountParserTestCase(TestCase):
     def test_parse(self):
         lines = [
@@ -725,3 +806,274 @@ class Bai2FileParserTestCase(TestCase):
         parser = Bai2FileParser(IteratorHelper(lines), check_integrity=False)
         bai2_file = parser.parse()
         self.assertTrue(isinstance(bai2_file, Bai2File))
+
+
+class Bai2FileParserEventsTestCase(TestCase):
+    lines = [
+        '01,122099999,123456789,040621,0200,1,,,2/',
+        '02,031001234,122099999,1,040620,2359,GBP,2/',
+        '03,0975312468,GBP,010,500000,,,190,70000000,4,0/',
+        '16,165,1500000,1,DD1620,, DEALER PAYMENTS',
+        '16,115,500000,S,250000,250000,0/',
+        '88,AX13612,B096132,AMALGAMATED CORP. LOCKBOX',
+        '49,72500000,5/',
+        '98,72500000,1,7/',
+        '99,72500000,1,9/',
+    ]
+
+    def test_iter_events(self):
+        parser = Bai2FileParser(IteratorHelper(self.lines))
+
+        events = list(parser.iter_events())
+
+        self.assertEqual(
+            [event.type for event in events],
+            [
+                EventType.file_header,
+                EventType.group_start,
+                EventType.account_start,
+                EventType.transaction,
+                EventType.transaction,
+                EventType.account_end,
+                EventType.group_end,
+                EventType.file_end,
+            ],
+        )
+        self.assertTrue(isinstance(events[0].obj, Bai2FileHeader))
+        self.assertTrue(isinstance(events[1].obj, GroupHeader))
+        self.assertTrue(isinstance(events[2].obj, AccountIdentifier))
+        self.assertTrue(isinstance(events[3].obj, TransactionDetail))
+        self.assertEqual(events[4].obj.amount, 500000)
+        self.assertEqual(events[4].obj.text, 'AMALGAMATED CORP. LOCKBOX')
+        self.assertTrue(isinstance(events[5].obj, AccountTrailer))
+        self.assertTrue(isinstance(events[6].obj, GroupTrailer))
+        self.assertTrue(isinstance(events[7].obj, Bai2FileTrailer))
+
+    def test_fails_integrity_on_account_control_total(self):
+        lines = list(self.lines)
+        lines[6] = '49,72500001,5/'
+
+        parser = Bai2FileParser(IteratorHelper(lines))
+        events = parser.iter_events()
+
+        self.assertEqual(next(events).type, EventType.file_header)
+        with self.assertRaises(IntegrityException):
+            list(events)
+
+    def test_fails_integrity_on_numbers_of_records(self):
+        lines = list(self.lines)
+        lines[-1] = '99,72500000,1,10/'
+
+        parser = Bai2FileParser(IteratorHelper(lines))
+        self.assertRaises(IntegrityException, list, parser.iter_events())
+
+    def test_fails_without_trailer(self):
+        parser = Bai2FileParser(IteratorHelper(self.lines[:-1]))
+        self.assertRaises(ParsingException, list, parser.iter_events())
+
+    def test_ignore_integrity_checks(self):
+        lines = list(self.lines)
+        lines[-1] = '99,72500001,2,10/'
+
+        parser = Bai2FileParser(IteratorHelper(lines), check_integrity=False)
+        events = list(parser.iter_events())
+        self.assertEqual(events[-1].type, EventType.file_end)
+
+
+class StateMachineParserTestCase(TestCase):
+    lines = Bai2FileParserEventsTestCase.lines
+
+    def test_parse(self):
+        bai2_file = StateMachineParser(IteratorHelper(self.lines)).parse()
+        expected = Bai2FileParser(IteratorHelper(self.lines)).parse()
+
+        self.assertTrue(isinstance(bai2_file, Bai2File))
+        self.assertEqual(bai2_file.as_string(), expected.as_string())
+
+        account = bai2_file.children[0].children[0]
+        self.assertEqual([child.amount for child in account.children], [1500000, 500000])
+        self.assertEqual(account.trailer.account_control_total, 72500000)
+
+    def test_iter_events(self):
+        events = StateMachineParser(IteratorHelper(self.lines)).iter_events()
+        expected = Bai2FileParser(IteratorHelper(self.lines)).iter_events()
+
+        self.assertEqual(
+            [(event.type, event.obj.rows) for event in events],
+            [(event.type, event.obj.rows) for event in expected],
+        )
+
+    def test_same_errors_as_section_parsers(self):
+        cases = [
+            self.lines[1:],
+            self.lines[:2] + self.lines[6:],
+            self.lines[:3] + self.lines[7:],
+            self.lines[:6] + self.lines[7:],
+            self.lines[:4] + self.lines[6:],
+            self.lines[:-1],
+            self.lines[:-2],
+            self.lines[:1] + self.lines[-1:],
+        ]
+        for lines in cases:
+            with self.assertRaises((ParsingException, IntegrityException)) as expected:
+                Bai2FileParser(IteratorHelper(lines)).parse()
+            with self.assertRaises(type(expected.exception)) as raised:
+                StateMachineParser(IteratorHelper(lines)).parse()
+            self.assertEqual(str(raised.exception), str(expected.exception))
+
+    def test_fails_at_end_of_file_after_transaction(self):
+        parser = StateMachineParser(IteratorHelper(self.lines[:4]))
+        self.assertRaises(ParsingException, parser.parse)
+
+    def test_ignore_integrity_checks(self):
+        lines = list(self.lines)
+        lines[-1] = '99,72500001,2,10/'
+
+        parser = StateMachineParser(IteratorHelper(lines), check_integrity=False)
+        self.assertTrue(isinstance(parser.parse(), Bai2File))
+
+    def test_honours_custom_section_parsers(self):
+        class CustomGroupHeaderParser(GroupHeaderParser):
+            def validate(self, obj):
+                raise NotSupportedYetException('custom group header validation')
+
+        class CustomGroupParser(GroupParser):
+            header_parser_class = CustomGroupHeaderParser
+
+        class CustomBai2FileParser(Bai2FileParser):
+            child_parser_class = CustomGroupParser
+
+        parser = StateMachineParser(IteratorHelper(self.lines), parser_class=CustomBai2FileParser)
+        self.assertRaises(NotSupportedYetException, parser.parse)
+
+
+class ParallelParserTestCase(TestCase):
+    lines = (
+        Bai2FileParserEventsTestCase.lines[:1]
+        + Bai2FileParserEventsTestCase.lines[1:-1] * 3
+        + ['99,217500000,3,24/', '88,CONTINUED']
+    )
+
+    def test_parse(self):
+        expected = StateMachineParser(IteratorHelper(self.lines)).parse()
+
+        for executor_class in (ThreadPoolExecutor, ProcessPoolExecutor):
+            with self.subTest(executor_class=executor_class), executor_class(max_workers=2) as executor:
+                bai2_file = ParallelParser(self.lines, executor, chunksize=2).parse()
+                self.assertEqual(bai2_file.as_string(), expected.as_string())
+                self.assertIs(bai2_file.children[2].parent, bai2_file)
+                self.assertEqual(bai2_file.trailer.file_control_total, 217500000)
+
+    def test_parse_transactions_in_chunks(self):
+        expected = StateMachineParser(IteratorHelper(self.lines)).parse()
+
+        for executor_class in (ThreadPoolExecutor, ProcessPoolExecutor):
+            with executor_class(max_workers=2) as executor:
+                for records_per_chunk in (1, 2, 10):
+                    with self.subTest(executor_class=executor_class, records_per_chunk=records_per_chunk):
+                        bai2_file = ParallelParser(self.lines, executor, records_per_chunk=records_per_chunk).parse()
+                        self.assertEqual(bai2_file.as_string(), expected.as_string())
+                        account = bai2_file.children[1].children[0]
+                        self.assertEqual(account.children[1].text, 'AMALGAMATED CORP. LOCKBOX')
+                        self.assertIs(account.parent, bai2_file.children[1])
+
+    def test_fails_integrity_on_account_control_total_in_chunks(self):
+        lines = list(self.lines)
+        lines[13] = '49,72500001,5/'
+
+        with self.assertRaises(IntegrityException) as expected:
+            StateMachineParser(IteratorHelper(lines)).parse()
+        with ThreadPoolExecutor(max_workers=2) as executor, self.assertRaises(IntegrityException) as raised:
+            ParallelParser(lines, executor, records_per_chunk=1).parse()
+        self.assertEqual(str(raised.exception), str(expected.exception))
+
+    def test_same_errors_as_sequential_parsing(self):
+        lines = self.lines
+        cases = [
+            lines[1:],
+            lines[:1] + lines[2:],
+            lines[:8] + lines[9:],
+            lines[:-2] + ['99,217500001,3,23/'],
+            lines[:-2] + ['99,217500000,2,23/'],
+            lines[:-2],
+            lines[:-2] + ['03,0975312468,GBP,010,500000,,,190,70000000,4,0/'] + lines[-2:],
+            lines[:1] + ['88,CONTINUED'] + lines[1:],
+            lines[:1] + lines[-2:],
+        ]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            for case in cases:
+                with self.assertRaises((ParsingException, IntegrityException)) as expected:
+                    StateMachineParser(IteratorHelper(case)).parse()
+                with self.assertRaises(type(expected.exception)) as raised:
+                    ParallelParser(case, executor).parse()
+                self.assertEqual(str(raised.exception), str(expected.exception))
+
+    def test_ignore_integrity_checks(self):
+        lines = self.lines[:-2] + ['99,217500001,2,10/']
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            bai2_file = ParallelParser(lines, executor, check_integrity=False, retain_rows=False).parse()
+        self.assertEqual(len(bai2_file.children), 3)
+        self.assertEqual(bai2_file.children[0].header.rows, ())
+
+
+class PipelinedParserTestCase(TestCase):
+    lines = ParallelParserTestCase.lines
+
+    def test_iter_events(self):
+        expected = StateMachineParser(IteratorHelper(self.lines)).iter_events()
+
+        for batch_size in (1, 2, 256):
+            with self.subTest(batch_size=batch_size):
+                events = PipelinedParser(iter(self.lines), queue_size=2, batch_size=batch_size).iter_events()
+                self.assertEqual(
+                    [(event.type, event.obj.rows) for event in events],
+                    [(event.type, event.obj.rows) for event in expected],
+                )
+                expected = StateMachineParser(IteratorHelper(self.lines)).iter_events()
+
+    def test_same_errors_as_sequential_parsing(self):
+        lines = self.lines
+        cases = [
+            lines[1:],
+            lines[:8] + lines[9:],
+            lines[:-2] + ['99,217500001,3,23/'],
+            lines[:4] + ['16,165,ABC,1,DD1620,, DEALER PAYMENTS'] + lines[5:],
+            lines[:4] + ['XX,165'] + lines[5:],
+        ]
+        for case in cases:
+            expected = []
+            with self.assertRaises(Exception) as expected_error:
+                for event in StateMachineParser(IteratorHelper(case)).iter_events():
+                    expected.append(event.obj.rows)
+
+            events = []
+            with self.assertRaises(type(expected_error.exception)) as raised:
+                for event in PipelinedParser(iter(case), batch_size=2).iter_events():
+                    events.append(event.obj.rows)
+            self.assertEqual(str(raised.exception), str(expected_error.exception))
+            self.assertEqual(events, expected)
+
+    def test_stops_stages_when_events_stop_being_read(self):
+        number_of_threads = threading.active_count()
+        events = PipelinedParser(iter(self.lines * 100), queue_size=1, batch_size=1).iter_events()
+
+        self.assertEqual(next(events).type, EventType.file_header)
+        events.close()
+        self.assertEqual(threading.active_count(), number_of_threads)
+
+    def test_queue_metrics(self):
+        parser = PipelinedParser(iter(self.lines), queue_size=1, batch_size=1)
+
+        for _event in parser.iter_events():
+            # as if delivering the events did some I/O
+            time.sleep(0.001)
+
+        records, events = parser.queues
+        self.assertEqual((records.name, events.name), ('records', 'events'))
+        # one batch per record, continuations included in theirs, then the end of the records
+        self.assertEqual(records.number_of_batches, 21)
+        self.assertLessEqual(events.max_depth, 1)
+        self.assertGreater(events.mean_depth, 0)
+        self.assertGreater(events.put_wait, 0)
+        self.assertEqual(events.depth, 0)
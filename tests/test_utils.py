@@ -1,7 +1,7 @@
 import datetime
 from unittest import TestCase
 
-from bai2.utils import parse_date, parse_military_time, parse_time, write_time
+from bai2.utils import parse_clock_time, parse_date, parse_military_time, parse_time, write_date, write_time
 
 
 class ParseDateTestCase(TestCase):
@@ -31,6 +31,22 @@ class ParseTimeTestCase(TestCase):
         )
 
 
+class ParseClockTime(TestCase):
+    def test_parse(self):
+        parsed_value = parse_clock_time('21:45:34')
+
+        self.assertEqual(
+            datetime.time(hour=21, minute=45, second=34),
+            parsed_value,
+        )
+
+    def test_parse_other_separators(self):
+        for value in ['12-34-56', '12x34y56']:
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    parse_clock_time(value)
+
+
 class ParseMilitaryTime(TestCase):
     def test_parse(self):
         parsed_value = parse_military_time('2145')
@@ -89,3 +105,30 @@ class WriteTime(TestCase):
 
         str_value = write_time(time, True)
         self.assertEqual(str_value, '2400')
+
+
+class DatesCacheTestCase(TestCase):
+    def test_parse_date_is_cached(self):
+        parse_date.cache_clear()
+
+        first = parse_date('150716')
+        second = parse_date('150716')
+
+        self.assertEqual(first, datetime.date(year=2015, month=7, day=16))
+        self.assertIs(first, second)
+        self.assertEqual(parse_date.cache_info().hits, 1)
+
+    def test_parse_date_pivot_year(self):
+        self.assertEqual(parse_date('680101'), datetime.date(year=2068, month=1, day=1))
+        self.assertEqual(parse_date('690101'), datetime.date(year=1969, month=1, day=1))
+
+    def test_parse_invalid_values(self):
+        self.assertRaises(ValueError, parse_date, '151301')
+        self.assertRaises(ValueError, parse_time, '2460')
+        self.assertRaises(ValueError, parse_time, '23:59:60')
+
+    def test_parse_short_military_time(self):
+        self.assertEqual(parse_time('123'), datetime.time(hour=12, minute=3))
+
+    def test_write_date(self):
+        self.assertEqual(write_date(datetime.date(year=2015, month=3, day=30)), '150330')
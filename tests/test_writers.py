@@ -1,8 +1,73 @@
+import io
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import date, time
+from types import SimpleNamespace
 from unittest import TestCase
 
 from bai2 import constants, models, writers
+from bai2.exceptions import WritingException
+
+
+class CompileFieldsEncoderTestCase(TestCase):
+    def test_encode(self):
+        encode = writers.compile_fields_encoder([
+            'name',
+            ('count', lambda w, value: value * 2),
+            ('parts', writers.expands_fields(lambda w, value: value.split('-'))),
+            'missing',
+        ])
+
+        self.assertEqual(
+            encode(None, SimpleNamespace(name='A', count=2, parts='x-y')),
+            ['A', '4', 'x', 'y', ''],
+        )
+        self.assertEqual(
+            encode(None, SimpleNamespace(name=None, count=None, parts=None)),
+            ['', '', '', ''],
+        )
+
+    def test_encode_dict_results(self):
+        encode = writers.compile_fields_encoder([
+            ('total', lambda w, value: {'a': str(value), 'b': 'X'}),
+            ('count', lambda w, value: value),
+        ])
+
+        self.assertEqual(encode(None, SimpleNamespace(total=5, count=2)), ['5', 'X', '2'])
+        self.assertEqual(encode(None, SimpleNamespace(total=None, count=2)), ['', '2'])
+
+    def test_custom_fields_config_returning_dict(self):
+        class CustomAccountTrailerWriter(writers.AccountTrailerWriter):
+            fields_config = [
+                ('account_control_total', lambda w, value: OrderedDict([('a', str(value)), ('b', 'X')])),
+                'number_of_records',
+            ]
+
+        trailer = models.AccountTrailer(account_control_total=5, number_of_records=2)
+        self.assertEqual(CustomAccountTrailerWriter(trailer).write(), ['49,5,X,2/'])
+
+    def test_compiled_for_writer_classes(self):
+        summary = models.Summary(
+            type_code=constants.TypeCodes['010'], amount=100, funds_type=constants.FundsType.immediate_availability,
+        )
+        self.assertEqual(
+            writers.AccountIdentifierWriter.encode_summary_fields(None, summary),
+            ['010', '100', '', '0'],
+        )
+
+
+class LineEncoderTestCase(TestCase):
+    def test_iter_chunks(self):
+        encoder = writers.LineEncoder(line_terminator='\r\n', lines_per_chunk=2)
+        lines = ['a', 'b', 'c', 'd', 'e']
+
+        self.assertEqual(list(encoder.iter_chunks(lines)), ['a\r\nb', '\r\nc\r\nd', '\r\ne'])
+        self.assertEqual(encoder.number_of_lines, 5)
+
+    def test_iter_bytes(self):
+        encoder = writers.LineEncoder(encoding='latin-1', lines_per_chunk=1)
+
+        self.assertEqual(b''.join(encoder.iter_bytes(['caf\xe9', 'b'])), b'caf\xe9\nb')
 
 
 class TransactionDetailWriterTestCase(TestCase):
@@ -321,6 +386,15 @@ class GroupWriterTestCase(TestCase):
 
         return models.Group(header=group_header, children=accounts)
 
+    def test_group_options_apply_to_children(self):
+        group = GroupWriterTestCase.create_group_section()
+
+        output = writers.GroupWriter(group, text_on_new_line=True).write()
+        self.assertEqual(
+            output[2:4],
+            ['16,399,2599,,,/', '88,BILLS BILLS BILLS BILLS BILLS BILLS BILLS BILLS BILLS BILLS BILLS BILLS'],
+        )
+
     def test_group_renders_correctly(self):
         group = GroupWriterTestCase.create_group_section()
 
@@ -400,3 +474,127 @@ class Bai2FileWriterTestCase(TestCase):
                 '99,94396,2,26/',
             ],
         )
+
+    def test_bai2_file_options_apply_to_records(self):
+        bai2_file = Bai2FileWriterTestCase.create_bai2_file()
+
+        output = writers.Bai2FileWriter(bai2_file, line_length=40).write()
+        self.assertEqual(
+            output[2:9],
+            [
+                '03,77777777,GBP,010,10000,,,015,10000,/',
+                '88,/',
+                '16,399,2599,,,,BILLS BILLS BILLS BILLS B',
+                '88,ILLS BILLS BILLS BILLS BILLS BILLS BI',
+                '88,LLS BILLS',
+                '16,399,1000,0,,,OTHER',
+                '49,23599,7/',
+            ],
+        )
+        self.assertEqual(bai2_file.trailer.number_of_records, len(output))
+
+    def test_bai2_file_iter_lines_matches_write(self):
+        expected = writers.Bai2FileWriter(self.create_bai2_file()).write()
+
+        bai2_file = self.create_bai2_file()
+        lines = writers.Bai2FileWriter(bai2_file).iter_lines()
+        self.assertEqual(next(lines), expected[0])
+        # totals are only known once the children have been written
+        self.assertIsNone(bai2_file.trailer.number_of_records)
+        self.assertEqual([expected[0]] + list(lines), expected)
+        self.assertEqual(bai2_file.trailer.number_of_records, 26)
+        self.assertEqual(bai2_file.trailer.file_control_total, 94396)
+
+    def test_bai2_file_written_in_parallel_matches_write(self):
+        expected = writers.Bai2FileWriter(self.create_bai2_file()).write()
+
+        for executor_class in (ThreadPoolExecutor, ProcessPoolExecutor):
+            bai2_file = self.create_bai2_file()
+            with executor_class(max_workers=2) as executor:
+                output = writers.Bai2FileWriter(bai2_file, executor=executor, chunksize=2).write()
+
+            self.assertEqual(output, expected, executor_class.__name__)
+            self.assertEqual(bai2_file.trailer.number_of_records, 26)
+            self.assertEqual(bai2_file.children[0].children[0].trailer.number_of_records, 5)
+            self.assertEqual(bai2_file.children[0].children[0].trailer.account_control_total, 23599)
+
+    def test_parallel_writer_can_write_again(self):
+        expected = writers.Bai2FileWriter(self.create_bai2_file()).write()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            writer = writers.Bai2FileWriter(self.create_bai2_file(), executor=executor)
+            lines = writer.iter_lines()
+            next(lines)
+            lines.close()
+
+            self.assertEqual(writer.write(), expected)
+            self.assertEqual(writer.write(), expected)
+
+    def test_account_written_serially_with_executor(self):
+        account = self.create_bai2_file().children[0].children[0]
+        expected = writers.AccountWriter(account).write()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(writers.AccountWriter(account, executor=executor).write(), expected)
+
+
+class Bai2StreamWriterTestCase(TestCase):
+    def test_matches_bai2_file_writer(self):
+        bai2_file = Bai2FileWriterTestCase.create_bai2_file()
+        expected = '\n'.join(writers.Bai2FileWriter(Bai2FileWriterTestCase.create_bai2_file()).write())
+
+        f = io.StringIO()
+        writer = writers.Bai2StreamWriter(f)
+        writer.begin_file(bai2_file.header)
+        for group in bai2_file.children:
+            writer.begin_group(group.header)
+            for account in group.children:
+                writer.begin_account(account.header)
+                for transaction in account.children:
+                    writer.add_transaction(transaction)
+                writer.end_account()
+            writer.end_group()
+        trailer = writer.end_file()
+
+        self.assertEqual(f.getvalue(), expected)
+        self.assertEqual(trailer.file_control_total, 94396)
+        self.assertEqual(trailer.number_of_groups, 2)
+        self.assertEqual(trailer.number_of_records, 26)
+
+    def test_fields(self):
+        f = io.BytesIO()
+        writer = writers.Bai2StreamWriter(f)
+        writer.begin_file(sender_id='EGBANK', creation_date=date(2015, 7, 15), creation_time=time(23, 40))
+        writer.begin_group(group_status=constants.GroupStatus.update)
+        writer.begin_account(customer_account_number='77777777')
+        writer.add_transaction(type_code=constants.TypeCodes['399'], amount=100)
+        writer.add_transaction(type_code=constants.TypeCodes['399'], amount=50)
+        writer.end_account()
+        writer.end_group()
+        writer.end_file()
+
+        self.assertEqual(
+            f.getvalue().decode().splitlines()[-3:],
+            ['49,150,4/', '98,150,1,6/', '99,150,1,8/'],
+        )
+
+    def test_unexpected_records(self):
+        writer = writers.Bai2StreamWriter(io.StringIO())
+        with self.assertRaisesRegex(WritingException, 'Unexpected TransactionDetail after start of file'):
+            writer.add_transaction(amount=100)
+
+        writer.begin_file()
+        with self.assertRaisesRegex(WritingException, 'Unexpected AccountIdentifier after Bai2FileHeader'):
+            writer.begin_account()
+        with self.assertRaisesRegex(WritingException, 'Unexpected Bai2FileHeader after Bai2FileHeader'):
+            writer.begin_file()
+
+    def test_empty_sections(self):
+        writer = writers.Bai2StreamWriter(io.StringIO())
+        writer.begin_file()
+        with self.assertRaisesRegex(WritingException, 'Unexpected Bai2FileTrailer after Bai2FileHeader'):
+            writer.end_file()
+
+        writer.begin_group()
+        with self.assertRaisesRegex(WritingException, 'Unexpected GroupTrailer after GroupHeader'):
+            writer.end_group()